@@ -0,0 +1,178 @@
+"""Benchmark utility.format_blog on large synthetic articles.
+
+Compares the streaming renderer with the original string-concatenating
+implementation, checks that both produce the same Markdown, and prints
+timings. Run from the repository root:
+
+    python benchmarks/bench_format_blog.py [--paragraphs N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyfanbox import render, types  # noqa: E402
+
+
+# The implementation format_blog had before the renderer, kept as the reference.
+
+def legacy_format_blog(body: types._PostInfoBody, creatorId: str):
+    text = ''
+    if isinstance(body.blocks, type):
+        return body.text
+    for block in body.blocks:
+        if isinstance(block, types._ArticleParagraphBlock):
+            t = ''
+            insertion = {}
+            if not isinstance(block.styles, type):
+                for style in reversed(block.styles):
+                    b, e = style.offset, style.offset + style.length
+                    insertion[b] = ' **'
+                    insertion[e] = '** '
+            if not isinstance(block.links, type):
+                for link in reversed(block.links):
+                    b, e = link.offset, link.offset + link.length
+                    if b in insertion:
+                        if insertion[b] == ' **':
+                            insertion[b] = ' **['
+                        elif insertion[b] == '** ':
+                            insertion[b] = '** ['
+                        else:
+                            insertion[b] = '['
+                    else:
+                        insertion[b] = '['
+                    if e in insertion:
+                        if insertion[e] == ' **':
+                            insertion[e] = '](' + link.url + ') **'
+                        elif insertion[e] == '** ':
+                            insertion[e] = '](' + link.url + ')** '
+                        else:
+                            insertion[e] = '](' + link.url + ')'
+                    else:
+                        insertion[e] = '](' + link.url + ')'
+            insertion = dict(sorted(insertion.items()))
+
+            prev = 0
+            for k, v in insertion.items():
+                t += block.text[prev:k]
+                t += v
+                prev = k
+            t += block.text[prev:]
+            text += (t + '\n\n')
+        elif isinstance(block, types._ArticleHeaderBlock):
+            text += ('\n\n### ' + block.text + '\n\n')
+        elif isinstance(block, types._ArticleImageBlock):
+            text += ('{image:' + block.imageId + '}\n\n')
+        elif isinstance(block, types._ArticleFileBlock):
+            text += ('{file:' + block.fileId + '}\n\n')
+        elif isinstance(block, types._ArticleURLEmbedBlock):
+            if isinstance(body.urlEmbedMap, type):
+                raise AttributeError('body.urlEmbedMap is not defined!')
+            urlEmbed = body.urlEmbedMap[block.urlEmbedId]
+            if isinstance(urlEmbed, types._UrlEmbedDefault):
+                url = urlEmbed.url
+                text += (f'[{url}]({url})\n\n')
+            elif isinstance(urlEmbed, types._UrlEmbedHtml):
+                html = urlEmbed.html
+                text += (html)
+            elif isinstance(urlEmbed, types._UrlEmbedHtmlCard):
+                html = urlEmbed.html
+                text += (html)
+            elif isinstance(urlEmbed, types._UrlEmbedFanboxCreator):
+                creator_id = urlEmbed.profile.creatorId
+                url = 'https://' + creator_id + '.fanbox.cc/'
+                text += (f'[FANBOX CREATOR]({url})\n\n')
+            elif isinstance(urlEmbed, types._UrlEmbedFanboxPost):
+                post_id = urlEmbed.postInfo.id
+                url = 'https://' + creatorId + '.fanbox.cc/posts/' + post_id
+                text += (f'[FANBOX POST]({url})\n\n')
+            else:
+                text += ('! - UNKNOWN FORMAT OF URL EMBED - !\n\n')
+        else:
+            text += ('! - UNKNOWN FORMAT OF BLOCK - !\n\n')
+
+    return text
+
+
+def make_article(paragraphs: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    blocks: list[dict] = []
+    for i in range(paragraphs):
+        text = ' '.join(f'word{rng.randrange(1000)}' for _ in range(rng.randrange(5, 60)))
+        block: dict = {'type': 'p', 'text': text}
+        # Overlapping and shared offsets exercise the marker merging rules.
+        if rng.random() < 0.5:
+            block['styles'] = [{'type': 'bold', 'offset': rng.randrange(len(text)),
+                                'length': rng.randrange(1, 20)} for _ in range(rng.randrange(1, 4))]
+        if rng.random() < 0.3:
+            block['links'] = [{'offset': rng.randrange(len(text)), 'length': rng.randrange(0, 20),
+                               'url': f'https://example.com/{i}/{j}'}
+                              for j in range(rng.randrange(1, 3))]
+        blocks.append(block)
+        if i % 50 == 0:
+            blocks.append({'type': 'header', 'text': f'Section {i}'})
+        if i % 40 == 0:
+            blocks.append({'type': 'image', 'imageId': f'im{i}'})
+        if i % 90 == 0:
+            blocks.append({'type': 'file', 'fileId': f'f{i}'})
+        if i % 30 == 0:
+            blocks.append({'type': 'url_embed', 'urlEmbedId': f'e{i % 150}'})
+    blocks.append({'type': 'unknown'})
+    embeds = {}
+    for i in range(0, 150, 30):
+        embeds[f'e{i}'] = [
+            {'id': f'e{i}', 'type': 'default', 'host': 'example.com', 'url': 'https://example.com/'},
+            {'id': f'e{i}', 'type': 'html', 'html': '<iframe></iframe>'},
+            {'id': f'e{i}', 'type': 'html.card', 'html': '<div></div>'},
+            {'id': f'e{i}', 'type': 'fanbox.creator',
+             'profile': {'user': {'userId': '1', 'name': 'n', 'iconUrl': None},
+                         'creatorId': 'someone', 'description': '', 'hasAdultContent': False,
+                         'coverImageUrl': None, 'profileLinks': [], 'profileItems': [],
+                         'isFollowed': False, 'isSupported': False, 'isStopped': False,
+                         'isAcceptingRequest': False, 'hasBoothShop': False}},
+            {'id': f'e{i}', 'type': 'unknown'},
+        ][i // 30]
+    return {'blocks': blocks, 'imageMap': {}, 'fileMap': {}, 'embedMap': {},
+            'urlEmbedMap': embeds}
+
+
+def timed(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paragraphs', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    types.WARN_UNKNOWN = False
+    for compact in (False, True):
+        body = types.decode(types._PostInfoBody, make_article(args.paragraphs), compact)
+        expected = legacy_format_blog(body, 'creator')
+        assert render.markdown.render(body, 'creator') == expected
+        sink = io.StringIO()
+        render.markdown.render_to(body, 'creator', sink)
+        assert sink.getvalue() == expected
+
+        old = timed(lambda: legacy_format_blog(body, 'creator'), args.repeat)
+        new = timed(lambda: render.markdown.render(body, 'creator'), args.repeat)
+        streamed = timed(lambda: render.markdown.render_to(body, 'creator', io.StringIO()),
+                         args.repeat)
+        print(f'{len(body.blocks)} blocks, {len(expected)} chars, compact={compact}')
+        print(f'  legacy      {old * 1000:8.2f} ms')
+        print(f'  render      {new * 1000:8.2f} ms  ({old / new:.2f}x)')
+        print(f'  render_to   {streamed * 1000:8.2f} ms  ({old / streamed:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
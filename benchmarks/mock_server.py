@@ -0,0 +1,152 @@
+"""Local mock of the FANBOX API, serving the recorded fixtures.
+
+Responses are pre-encoded at startup so the server adds as little CPU
+time as possible to client-side measurements. A fixed per-request
+latency can be added to simulate the network round trip.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from requests.adapters import HTTPAdapter
+
+from pyfanbox import transport
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+API = 'https://api.fanbox.cc'
+
+
+def load_fixture(name: str) -> dict:
+    with open(os.path.join(FIXTURES, name + '.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode()
+
+
+class MockFanbox():
+    def __init__(self, pages: int = 20, comment_pages: int = 5, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.hits: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        info = load_fixture('post_info')
+        info['body']['id'] = '__POST_ID__'
+        self._post_info = _encode(info).split(b'__POST_ID__')
+
+        listing = load_fixture('post_list_creator')
+        items = listing['body']['items']
+        self.creator_pages: list[bytes] = []
+        self.page_urls: list[str] = []
+        for page in range(pages):
+            body_items = []
+            for n, item in enumerate(items):
+                body_items.append(dict(item, id=str(4000000 + page * len(items) + n)))
+            nextUrl = self._page_url(page + 1, len(items)) if page + 1 < pages else None
+            self.page_urls.append(self._page_url(page, len(items)))
+            self.creator_pages.append(_encode({'body': {'items': body_items, 'nextUrl': nextUrl}}))
+
+        comments = load_fixture('post_list_comments')
+        self.comment_pages: list[bytes] = []
+        for page in range(comment_pages):
+            nextUrl = None
+            if page + 1 < comment_pages:
+                nextUrl = API + '/post.listComments?' + parse.urlencode(
+                    {'postId': '{postId}', 'page': page + 1, 'limit': 10})
+            self.comment_pages.append(_encode({'body': {'items': comments['body']['items'],
+                                                        'nextUrl': nextUrl}}))
+        self.server: ThreadingHTTPServer | None = None
+
+    @staticmethod
+    def _page_url(page: int, limit: int):
+        # Same parameters as the real API; maxId encodes the page number.
+        return API + '/post.listCreator?' + parse.urlencode(
+            {'creatorId': '{creatorId}', 'maxPublishedDatetime': '2022-10-01 00:00:00',
+             'maxId': 4000000 + page * limit, 'limit': limit})
+
+    def post_info(self, postId: str) -> bytes:
+        return postId.encode().join(self._post_info)
+
+    def route(self, path: str, query: dict[str, str]) -> tuple[int, bytes]:
+        if path == '/user.countUnreadMessages':
+            return 200, b'{"body":0}'
+        if path == '/post.info':
+            return 200, self.post_info(query['postId'])
+        if path == '/post.paginateCreator':
+            urls = [u.replace('%7BcreatorId%7D', query['creatorId']) for u in self.page_urls]
+            return 200, _encode({'body': urls})
+        if path == '/post.listCreator':
+            page = (int(query.get('maxId', 4000000)) - 4000000) // int(query.get('limit', 10))
+            if not 0 <= page < len(self.creator_pages):
+                return 404, b'{"error":"general_error"}'
+            return 200, self.creator_pages[page].replace(
+                b'%7BcreatorId%7D', query['creatorId'].encode())
+        if path == '/post.listComments':
+            page = int(query.get('page', 0))
+            if page >= len(self.comment_pages):
+                return 404, b'{"error":"general_error"}'
+            return 200, self.comment_pages[page].replace(b'%7BpostId%7D', query['postId'].encode())
+        return 404, b'{"error":"general_error"}'
+
+    def start(self) -> str:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes; with Nagle on, keep-alive
+            # responses stall on delayed ACKs.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = parse.urlparse(self.path)
+                query = dict(parse.parse_qsl(url.query))
+                with mock._lock:
+                    mock.hits[url.path] = mock.hits.get(url.path, 0) + 1
+                if mock.latency:
+                    time.sleep(mock.latency)
+                status, content = mock.route(url.path, query)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base
+
+    @property
+    def base(self):
+        assert self.server is not None
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def session(self, pool_size: int = 10):
+        # A requests session whose api.fanbox.cc traffic goes to this server.
+        sess = transport.make_session(pool_size)
+        sess.mount(API, _RedirectAdapter(self.base, pool_connections=1, pool_maxsize=pool_size))
+        return sess
+
+
+class _RedirectAdapter(HTTPAdapter):
+    def __init__(self, base: str, **kwargs) -> None:
+        self.base = base
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = self.base + request.url[len(API):]
+        return super().send(request, **kwargs)
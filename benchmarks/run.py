@@ -0,0 +1,246 @@
+"""Benchmark suite for model decoding, rendering and crawl throughput.
+
+Micro benchmarks run against the recorded fixtures in benchmarks/fixtures.
+Crawl benchmarks run the real client end to end against a local mock
+FANBOX server (benchmarks/mock_server.py). Every number is the median of
+several timed repeats, so runs on the same machine are comparable.
+
+    python benchmarks/run.py                      # full suite
+    python benchmarks/run.py --only decode,render # selected groups
+    python benchmarks/run.py --json out.json      # save results
+    python benchmarks/run.py --compare out.json   # diff against a saved run
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockFanbox, load_fixture  # noqa: E402
+
+from pyfanbox import json_backend, render, types, utility  # noqa: E402
+from pyfanbox.cache import ResponseCache  # noqa: E402
+from pyfanbox.main import CC_FANBOX_API  # noqa: E402
+from pyfanbox.metrics import Instrumentation  # noqa: E402
+
+GROUPS: dict[str, Callable[['Suite'], None]] = {}
+
+
+def group(func: Callable[['Suite'], None]):
+    GROUPS[func.__name__.removeprefix('bench_')] = func
+    return func
+
+
+class Suite():
+    def __init__(self, repeat: int, scale: float, latency: float) -> None:
+        self.repeat = repeat
+        self.scale = scale
+        self.latency = latency
+        self.results: dict[str, dict[str, Any]] = {}
+
+    def n(self, number: int):
+        return max(1, int(number * self.scale))
+
+    def time(self, name: str, func: Callable[[], Any], number: int, unit: str = 'op'):
+        number = self.n(number)
+        func()
+        samples = []
+        for _ in range(self.repeat):
+            gc.collect()
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+        self.record(name, statistics.median(samples), min(samples), unit)
+
+    def record(self, name: str, median: float, best: float, unit: str = 'op', **extra):
+        self.results[name] = {'median': median, 'min': best, 'unit': unit, **extra}
+        line = f'{name:44s} {median * 1e6:12.1f} us/{unit}  {1 / median:12.1f} {unit}/s'
+        if extra:
+            line += '  ' + '  '.join(f'{k}={v:.2f}' if isinstance(v, float) else f'{k}={v}'
+                                     for k, v in extra.items())
+        print(line)
+
+
+# === Micro benchmarks ===
+
+@group
+def bench_decode(suite: Suite):
+    fixtures = {name: load_fixture(name)
+                for name in ('post_info', 'post_list_creator', 'post_list_comments')}
+    raw = {name: json_backend.dumps(data) for name, data in fixtures.items()}
+
+    for name, content in raw.items():
+        suite.time(f'json.loads[{json_backend.BACKEND}] {name}',
+                   lambda: json_backend.loads(content), 200)
+
+    def full(compact: bool):
+        body = types.decode(types.APIPostInfo, json_backend.loads(raw['post_info']), compact).body.body
+        assert body is not None
+        return body.blocks, body.imageMap, body.fileMap, body.urlEmbedMap
+
+    suite.time('decode post.info metadata', lambda: types.decode(
+        types.APIPostInfo, json_backend.loads(raw['post_info'])), 100)
+    suite.time('decode post.info full', lambda: full(False), 100)
+    suite.time('decode post.info full compact', lambda: full(True), 100)
+    suite.time('decode post.listCreator', lambda: types.decode(
+        types.APIPostListCreator, json_backend.loads(raw['post_list_creator'])), 300)
+    suite.time('decode post.listComments', lambda: types.decode(
+        types.APIPostListComments, json_backend.loads(raw['post_list_comments'])), 300)
+
+    post = types.decode(types.APIPostInfo, fixtures['post_info'])
+    full(False)
+    suite.time('encode post.info', lambda: json_backend.dumps(post), 100)
+
+
+@group
+def bench_render(suite: Suite):
+    post = types.decode(types.APIPostInfo, load_fixture('post_info')).body
+    body = post.body
+    assert body is not None
+    suite.time('format_blog post.info',
+               lambda: utility.utility.format_blog(body, post.creatorId), 200)
+    for name in render.RENDERERS:
+        renderer = render.get_renderer(name, 'media')
+        suite.time(f'render[{name}] post.info', lambda: renderer.render(body, post.creatorId), 200)
+    suite.time('render_to[markdown] post.info',
+               lambda: render.markdown.render_to(body, post.creatorId, io.StringIO()), 200)
+
+
+# === End-to-end crawl benchmarks ===
+
+def _client(mock: MockFanbox, **options):
+    # The client does not resize a session it is given, so pools are sized up front.
+    return CC_FANBOX_API('benchmark', session=mock.session(64), **options)
+
+
+@group
+def bench_crawl(suite: Suite):
+    mock = MockFanbox(pages=suite.n(20), latency=suite.latency)
+    mock.start()
+    try:
+        api = _client(mock)
+
+        samples = []
+        for i in range(suite.n(200)):
+            start = time.perf_counter()
+            api.POST.info(4000000 + i)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        suite.record('get post.info latency', statistics.median(samples), samples[0], 'req',
+                     p95_ms=samples[int(len(samples) * 0.95)] * 1000)
+
+        instrumented = _client(mock, instrument=Instrumentation())
+        ids = [4000000 + i for i in range(suite.n(200))]
+
+        def observed():
+            for postId in ids:
+                instrumented.POST.info(postId)
+            return len(ids)
+        _throughput(suite, 'post.info instrumented', observed)
+
+        for prefetch in (False, True):
+            def crawl():
+                return sum(1 for _ in api.util.iter_posts('bench', prefetch=prefetch))
+            _throughput(suite, f'iter_posts prefetch={prefetch}', crawl)
+
+        for workers in (1, 4, 16):
+            def batch():
+                return sum(1 for _, _, e in api.util.fetch_posts(ids, max_workers=workers)
+                           if e is None)
+            _throughput(suite, f'fetch_posts workers={workers}', batch)
+
+        def browsable():
+            return len(api.util.get_browsable_posts('bench', max_workers=8))
+        _throughput(suite, 'get_browsable_posts workers=8', browsable)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(os.path.join(directory, 'cache.sqlite3'))
+            cached = _client(mock, cache=cache)
+            for postId in ids:
+                cached.POST.info(postId)
+
+            def hits():
+                for postId in ids:
+                    cached.POST.info(postId)
+                return len(ids)
+            _throughput(suite, 'post.info cache hits', hits)
+            cache.close()
+    finally:
+        mock.stop()
+
+
+def _throughput(suite: Suite, name: str, func: Callable[[], int]):
+    samples = []
+    items = 0
+    for _ in range(suite.repeat):
+        start = time.perf_counter()
+        items = func()
+        samples.append((time.perf_counter() - start) / max(items, 1))
+    suite.record(name, statistics.median(samples), min(samples), 'item', items=items)
+
+
+# === Reporting ===
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'json_backend': json_backend.BACKEND, 'commit': commit}
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]):
+    print(f'\n{"benchmark":44s} {"baseline":>12s} {"current":>12s} {"change":>8s}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['median'], result['median']
+        print(f'{name:44s} {old * 1e6:12.1f} {new * 1e6:12.1f} {(new - old) / old * 100:+7.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', default=','.join(GROUPS),
+                        help='comma separated groups: ' + ', '.join(GROUPS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply iteration counts, e.g. 0.1 for a quick run')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='simulated network latency of the mock server in seconds')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='compare against a results file from --json')
+    args = parser.parse_args()
+
+    types.WARN_UNKNOWN = False
+    suite = Suite(args.repeat, args.scale, args.latency)
+    env = environment()
+    print(' '.join(f'{k}={v}' for k, v in env.items()))
+    for name in args.only.split(','):
+        print(f'\n# {name}')
+        GROUPS[name](suite)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': env, 'options': vars(args), 'results': suite.results},
+                      f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(suite.results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,42 @@
-from .main import *
-from . import auth
-from . import types
-from .types import FanboxJSONEncoder
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from . import auth, types
+    from .cache import OfflineCacheMiss, ResponseCache
+    from .main import CC_FANBOX_API
+    from .metrics import Instrumentation
+    from .scheduler import RequestScheduler
+    from .types import FanboxJSONEncoder
+
+__all__ = ['CC_FANBOX_API', 'OfflineCacheMiss', 'ResponseCache', 'RequestScheduler',
+           'Instrumentation', 'FanboxJSONEncoder', 'auth', 'types']
+
+_SUBMODULES = {'aio', 'auth', 'bulk', 'cache', 'download', 'export', 'index', 'json_backend', 'main',
+               'metrics', 'pyfanbox_enum', 'render', 'scheduler', 'sync', 'transport', 'types',
+               'utility'}
+_ATTRIBUTES = {'FanboxJSONEncoder': 'types', 'Instrumentation': 'metrics'}
+
+
+# Submodules and the client are imported on first access (PEP 562),
+# so that `import pyfanbox` does not pull in requests.
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    if name.startswith('__'):
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module('.' + _ATTRIBUTES.get(name, 'main'), __name__)
+    try:
+        value = getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | _SUBMODULES)
+
 
 __copyright__    = 'Copyright (C) 2022 Vent'
 __version__      = '1.0.0'
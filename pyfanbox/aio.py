@@ -0,0 +1,158 @@
+import asyncio
+from functools import partial
+from typing import TYPE_CHECKING, Awaitable, Callable, TypeVar
+
+import aiohttp
+
+from . import json_backend, types
+from .main import (CC_FANBOX_API, _API_BELL, _API_CREATOR, _API_NEWSLETTER,
+                   _API_PAYMENT, _API_PLAN, _API_POST, _API_TAG, _API_USER)
+from .scheduler import RequestScheduler
+
+if TYPE_CHECKING:
+    from .metrics import Instrumentation
+
+_API_RESPONCE = TypeVar('_API_RESPONCE', bound=types.APIResponce)
+
+
+class AsyncCC_FANBOX_API():
+    def __init__(self, FANBOXSESSID: str, max_concurrency: int = 8,
+                 compact: bool = False,
+                 scheduler: RequestScheduler | None = None,
+                 coalesce: bool = True,
+                 instrument: 'Instrumentation | None' = None) -> None:
+        self.FANBOXSESSID = FANBOXSESSID
+        self.max_concurrency = max_concurrency
+        self.compact = compact
+        self.scheduler = scheduler
+        self.instrument = instrument
+        if instrument is not None and scheduler is not None:
+            instrument.watch(scheduler)
+        self.coalesce = coalesce
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.sess: aiohttp.ClientSession | None = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._opening = asyncio.Lock()
+
+        self.POST = _API_POST(self)
+        self.CREATOR = _API_CREATOR(self)
+        self.PLAN = _API_PLAN(self)
+        self.TAG = _API_TAG(self)
+        self.BELL = _API_BELL(self)
+        self.USER = _API_USER(self)
+        self.NEWSLETTER = _API_NEWSLETTER(self)
+        self.PAYMENT = _API_PAYMENT(self)
+
+    async def open(self):
+        # Concurrent first requests wait here, and only a validated session is published.
+        async with self._opening:
+            if self.sess is not None:
+                return self
+            sess = aiohttp.ClientSession(
+                cookies={'FANBOXSESSID': self.FANBOXSESSID},
+                headers={'Origin': 'https://www.fanbox.cc'},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+            )
+            try:
+                async with sess.get('https://api.fanbox.cc/user.countUnreadMessages') as res:
+                    if not res.status == 200:
+                        raise RuntimeError('Could not connect to Fanbox API! (Invalid cookie "FANBOXSESSID"?)')
+            except BaseException:
+                await sess.close()
+                raise
+            self.sess = sess
+        return self
+
+    async def close(self):
+        if self.sess is not None:
+            await self.sess.close()
+            self.sess = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, _url: str, **query) -> dict:
+        if self.sess is None:
+            await self.open()
+        assert self.sess is not None
+        _url = CC_FANBOX_API.build_url(_url, **query)
+        if not self.coalesce:
+            return await self._fetch(_url)
+
+        flight = self._inflight.get(_url)
+        if flight is None:
+            # The fetch runs in a task owned by the flight, so a caller that is cancelled
+            # (e.g. by wait_for) stops waiting without cancelling it for the others.
+            flight = self._inflight[_url] = asyncio.ensure_future(self._fetch(_url))
+            flight.add_done_callback(partial(self._land, _url))
+        elif self.instrument is not None:
+            self.instrument.coalesced(_url)
+        return await asyncio.shield(flight)
+
+    def _land(self, _url: str, flight: asyncio.Future):
+        if self._inflight.get(_url) is flight:
+            del self._inflight[_url]
+        if not flight.cancelled():
+            # Mark retrieved so a flight nobody awaited any more does not log a warning.
+            flight.exception()
+
+    async def _fetch(self, _url: str) -> dict:
+        assert self.sess is not None
+        async with self._semaphore:
+            res = await self._send(_url, read=True)
+            try:
+                if not res.status == 200:
+                    raise RuntimeError('API access failed.', res.status, res.reason)
+                content = await res.read()
+            finally:
+                res.release()
+        if self.instrument is None:
+            return json_backend.loads(content)
+        with self.instrument.timer(_url, 'parse'):
+            return json_backend.loads(content)
+
+    async def request(self, cls: type[_API_RESPONCE], _url: str, **query) -> _API_RESPONCE:
+        data = await self.get(_url, **query)
+        if self.instrument is None:
+            return types.decode(cls, data, self.compact)
+        with self.instrument.timer(_url, 'decode'):
+            return types.decode(cls, data, self.compact)
+
+    async def download(self, url) -> aiohttp.ClientResponse:
+        if self.sess is None:
+            await self.open()
+        return await self._send(url)
+
+    async def _send(self, url: str, read: bool = False) -> aiohttp.ClientResponse:
+        sess = self.sess
+        assert sess is not None
+        request: Callable[[], Awaitable[aiohttp.ClientResponse]]
+        if self.instrument is None:
+            request = partial(sess.get, url)
+        else:
+            request = partial(self._attempt, sess, url, read)
+        if self.scheduler is None:
+            return await request()
+        return await self.scheduler.send_async(
+            url, request, retry_on=(aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def _attempt(self, sess: aiohttp.ClientSession, url: str,
+                       read: bool) -> aiohttp.ClientResponse:
+        # A single attempt, timed like the sync client: API bodies are read here,
+        # downloads stop at the headers.
+        assert self.instrument is not None
+        event = self.instrument.start(url)
+        try:
+            res = await sess.get(url)
+            content = await res.read() if read else None
+        except BaseException as e:
+            self.instrument.finish(event, error=e)
+            raise
+        size = res.content_length if content is None else len(content)
+        self.instrument.finish(event, res.status, res.headers, size)
+        return res
+
+    parse_qs = staticmethod(CC_FANBOX_API.parse_qs)
@@ -0,0 +1,102 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
+
+from . import json_backend, render, types
+from .export import JSONLWriter
+
+BulkResult = tuple[str, dict | None, str | None, BaseException | None]
+
+# Per-process renderers, built once per worker instead of once per batch.
+_RENDERERS: dict[tuple[str, str | None], render.Renderer] = {}
+
+
+def load_post(path: str, compact: bool = True) -> types._PostInfo:
+    with open(path, 'rb') as f:
+        data = json_backend.loads(f.read())
+    # Accept both a stored API response ({"body": {...}}) and a bare post.
+    if 'body' in data and isinstance(data['body'], dict) and 'creatorId' in data['body']:
+        data = data['body']
+    return types.decode(types._PostInfo, data, compact)
+
+
+def _render_batch(paths: list[str], renderer: str, media_dir: str | None,
+                  cache_dir: str | None, compact: bool) -> list[BulkResult]:
+    key = (renderer, media_dir)
+    if key not in _RENDERERS:
+        _RENDERERS[key] = render.get_renderer(renderer, media_dir)
+    cache = render.RenderCache(cache_dir) if cache_dir is not None else None
+    results: list[BulkResult] = []
+    for path in paths:
+        try:
+            post = load_post(path, compact)
+            text = render.render_post(post, _RENDERERS[key], cache)
+            # Decoded objects stay in the worker; only plain metadata travels back.
+            meta = {'id': post.id, 'creatorId': post.creatorId, 'title': post.title,
+                    'publishedDatetime': post.publishedDatetime,
+                    'updatedDatetime': post.updatedDatetime}
+            results.append((path, meta, text, None))
+        except Exception as e:
+            # Exceptions from C extensions do not always pickle, so send a plain one back.
+            results.append((path, None, None, RuntimeError('Render failed.', path, repr(e))))
+    return results
+
+
+def render_files(paths: Iterable[str], renderer: str = 'markdown',
+                 media_dir: str | None = None,
+                 cache: render.RenderCache | None = None,
+                 max_workers: int | None = None,
+                 chunksize: int = 64,
+                 compact: bool = True) -> Iterator[BulkResult]:
+    paths = iter(paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    cache_dir = cache.directory if cache is not None else None
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers) as executor:
+        def submit():
+            batch = list(islice(paths, chunksize))
+            if batch:
+                pending.append(executor.submit(_render_batch, batch, renderer, media_dir,
+                                               cache_dir, compact))
+            return bool(batch)
+
+        # Results come back batch by batch in submission order.
+        # Two batches per worker keep every process busy while the parent writes.
+        while len(pending) < max_workers * 2 and submit():
+            pass
+        try:
+            while pending:
+                results = pending.popleft().result()
+                submit()
+                yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def export_files(paths: Iterable[str], output_dir: str | None = None,
+                 jsonl: JSONLWriter | None = None,
+                 renderer: str = 'markdown',
+                 media_dir: str | None = None,
+                 cache: render.RenderCache | None = None,
+                 max_workers: int | None = None,
+                 chunksize: int = 64) -> list[tuple[str, BaseException]]:
+    extension = render.RENDERERS[renderer].extension
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    errors: list[tuple[str, BaseException]] = []
+    for path, meta, text, error in render_files(paths, renderer, media_dir, cache,
+                                                max_workers, chunksize):
+        if error is not None or meta is None or text is None:
+            errors.append((path, error or RuntimeError('Render failed.', path)))
+            continue
+        if output_dir is not None:
+            out = os.path.join(output_dir, meta['id'] + extension)
+            with open(out + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(out + '.tmp', out)
+        if jsonl is not None:
+            jsonl.write({**meta, 'format': renderer, 'text': text})
+    return errors
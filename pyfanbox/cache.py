@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib import parse
+
+
+class OfflineCacheMiss(RuntimeError):
+    pass
+
+
+class ResponseCache():
+    DEFAULT_TTL: dict[str, float | None] = {
+        'post.info': 6 * 60 * 60,
+        'post.listComments': 60 * 60,
+        'creator.get': 24 * 60 * 60,
+        'plan.listCreator': 24 * 60 * 60,
+        'tag.getFeatured': 24 * 60 * 60,
+        'user.countUnreadMessages': 0,
+        'bell.countUnread': 0,
+        'newsletter.countUnread': 0,
+    }
+
+    def __init__(self, path: str = '.pyfanbox/cache.sqlite3',
+                 ttl: dict[str, float | None] | None = None,
+                 default_ttl: float | None = 60 * 60,
+                 max_size: int | None = 512 * 1024 * 1024,
+                 offline: bool = False,
+                 touch_interval: float = 60) -> None:
+        self.path = path
+        self.ttl = dict(self.DEFAULT_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.offline = offline
+        # Access times only drive eviction order, so they are refreshed at most once per
+        # interval and written in batches instead of one commit per hit.
+        self.touch_interval = touch_interval
+        self._touched: dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, '
+                         'content BLOB NOT NULL, size INTEGER NOT NULL, '
+                         'created REAL NOT NULL, accessed REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                         'ON responses (accessed)')
+        self._db.commit()
+        self._size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def split_url(url: str):
+        parsed = parse.urlparse(url)
+        query = parse.urlencode(sorted(parse.parse_qsl(parsed.query)))
+        endpoint = parsed.path.lstrip('/')
+        return endpoint, parsed.netloc + parsed.path + '?' + query
+
+    def ttl_for(self, endpoint: str):
+        return self.ttl.get(endpoint, self.default_ttl)
+
+    def get(self, url: str) -> bytes | None:
+        endpoint, key = self.split_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT content, created, accessed FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            content, created, accessed = row
+            ttl = self.ttl_for(endpoint)
+            if not self.offline and ttl is not None and now - created >= ttl:
+                return None
+            if now - self._touched.get(key, accessed) >= self.touch_interval:
+                self._touched[key] = now
+                if len(self._touched) >= 256:
+                    self._flush_touched()
+                    self._db.commit()
+        return content
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                 [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, url: str, content: bytes):
+        endpoint, key = self.split_url(url)
+        if self.ttl_for(endpoint) == 0:
+            return
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._size -= row[0]
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, endpoint, content, len(content), now, now))
+            self._size += len(content)
+            self._touched.pop(key, None)
+            if self.max_size is not None and self._size > self.max_size:
+                self._flush_touched()
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if self.max_size is None or self._size <= self.max_size:
+            return
+        rows = self._db.execute('SELECT key, size FROM responses ORDER BY accessed')
+        evict = []
+        for key, size in rows:
+            if self._size <= self.max_size:
+                break
+            evict.append((key,))
+            self._size -= size
+        self._db.executemany('DELETE FROM responses WHERE key = ?', evict)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.commit()
+            self._touched.clear()
+            self._size = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
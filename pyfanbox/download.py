@@ -0,0 +1,305 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib import parse
+from typing import TYPE_CHECKING, Callable
+
+from . import types
+
+if TYPE_CHECKING:
+    from pyfanbox.main import CC_FANBOX_API
+
+
+class DownloadError(Exception):
+    pass
+
+
+class MediaStore():
+    def __init__(self, root: str = '.pyfanbox/media', link: bool = True) -> None:
+        self.root = root
+        self.link = link
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS media ('
+                         'key TEXT PRIMARY KEY, digest TEXT NOT NULL, '
+                         'extension TEXT NOT NULL, size INTEGER NOT NULL)')
+        self._db.commit()
+
+    @staticmethod
+    def url_key(url: str):
+        parsed = parse.urlparse(url)
+        return parsed.netloc + parsed.path
+
+    def object_path(self, digest: str, extension: str):
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}{extension}')
+
+    def lookup(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db.execute('SELECT digest, extension FROM media WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(*row)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def hasher(path: str | None = None, chunk_size: int = 1024 * 1024):
+        # sha256 over the bytes already in `path`, for the caller to continue.
+        h = hashlib.sha256()
+        if path is not None:
+            with open(path, 'rb') as f:
+                while chunk := f.read(chunk_size):
+                    h.update(chunk)
+        return h
+
+    def add(self, key: str, path: str, chunk_size: int = 1024 * 1024,
+            digest: str | None = None) -> str:
+        if digest is None:
+            digest = self.hasher(path, chunk_size).hexdigest()
+        extension = os.path.splitext(path.removesuffix('.part'))[1]
+        obj = self.object_path(digest, extension)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        if os.path.exists(obj):
+            os.remove(path)
+        else:
+            os.replace(path, obj)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?)',
+                             (key, digest, extension, os.path.getsize(obj)))
+            self._db.commit()
+        return obj
+
+    def place(self, obj: str, path: str):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and os.path.samefile(obj, path):
+            return path
+        # Place under a temporary name first, so a stale or truncated file at `path`
+        # is replaced instead of being kept.
+        tmp = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        linked = False
+        if self.link:
+            try:
+                os.link(obj, tmp)
+                linked = True
+            except OSError:
+                # Hard links do not cross devices; fall back to a copy.
+                pass
+        if not linked:
+            shutil.copyfile(obj, tmp)
+        os.replace(tmp, path)
+        return path
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class DownloadTask():
+    def __init__(self, url: str, path: str, size: int | None = None,
+                 key: str | None = None) -> None:
+        self.url = url
+        self.path = path
+        self.size = size
+        self.key = key
+        self.downloaded = 0
+        self.done = False
+        self.skipped = False
+        self.error: Exception | None = None
+
+
+ProgressCallback = Callable[[DownloadTask, int, int | None], None]
+
+
+class DownloadManager():
+    def __init__(self, api: 'CC_FANBOX_API', max_workers: int = 4,
+                 chunk_size: int = 1024 * 1024,
+                 progress: ProgressCallback | None = None,
+                 store: MediaStore | None = None) -> None:
+        self._api = api
+        self.store = store
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.tasks: list[DownloadTask] = []
+        self._paths: set[str] = set()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._key_locks_lock = threading.Lock()
+        api.ensure_pool_size(max_workers, download=True)
+
+    def add(self, url: str, path: str, size: int | None = None, key: str | None = None):
+        path = os.path.abspath(path)
+        if path in self._paths:
+            return None
+        self._paths.add(path)
+        if key is None and self.store is not None:
+            key = self.store.url_key(url)
+        task = DownloadTask(url, path, size, key)
+        self.tasks.append(task)
+        return task
+
+    @staticmethod
+    def image_filename(image: types._Image):
+        return f'{image.id}.{image.extension}'
+
+    @staticmethod
+    def file_filename(file: types._File):
+        return f'{file.id}_{file.name}.{file.extension}'
+
+    def add_image(self, image: types._Image, directory: str):
+        return self.add(image.originalUrl,
+                        os.path.join(directory, self.image_filename(image)),
+                        key='image:' + image.id)
+
+    def add_file(self, file: types._File, directory: str):
+        return self.add(file.url,
+                        os.path.join(directory, self.file_filename(file)),
+                        file.size, 'file:' + file.id)
+
+    def add_post(self, body: types._PostInfoBody, directory: str):
+        images: list[types._Image] = []
+        files: list[types._File] = []
+        if not isinstance(body.images, type):
+            images += body.images
+        if not isinstance(body.imageMap, type):
+            images += body.imageMap.values()
+        if not isinstance(body.files, type):
+            files += body.files
+        if not isinstance(body.fileMap, type):
+            files += body.fileMap.values()
+
+        tasks = [self.add_image(image, directory) for image in images]
+        tasks += [self.add_file(file, directory) for file in files]
+        return [t for t in tasks if t is not None]
+
+    def run(self):
+        tasks = [t for t in self.tasks if not t.done]
+        if self.max_workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(min(self.max_workers, len(tasks))) as executor:
+                list(executor.map(self._run_task, tasks))
+        else:
+            for task in tasks:
+                self._run_task(task)
+        return tasks
+
+    def _run_task(self, task: DownloadTask):
+        task.error = None
+        try:
+            self.fetch(task)
+        except Exception as e:
+            task.error = e
+
+    def fetch(self, task: DownloadTask):
+        if self.store is None or task.key is None:
+            return self._fetch(task)
+        # Tasks sharing a key run one at a time, so only the first one transfers bytes.
+        with self._key_locks_lock:
+            lock = self._key_locks.setdefault(task.key, threading.Lock())
+        with lock:
+            return self._fetch(task)
+
+    def _fetch(self, task: DownloadTask):
+        if os.path.exists(task.path) and \
+                (task.size is None or os.path.getsize(task.path) == task.size):
+            task.downloaded = os.path.getsize(task.path)
+            task.done = task.skipped = True
+            return task
+
+        # Known media is linked from the store without transferring any bytes.
+        if self.store is not None and task.key is not None:
+            obj = self.store.lookup(task.key)
+            if obj is not None and (task.size is None or os.path.getsize(obj) == task.size):
+                self.store.place(obj, task.path)
+                task.downloaded = self._placed_size(task)
+                task.done = task.skipped = True
+                return task
+
+        directory = os.path.dirname(task.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        part = task.path + '.part'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if task.size is not None and offset > task.size:
+            offset = 0
+
+        headers = {'Range': f'bytes={offset}-'} if offset else None
+        res = self._api.download(task.url, headers=headers)
+        h = None
+        try:
+            if res.status_code == 416 and offset:
+                # The .part may already be complete, e.g. after a crash before the rename.
+                total = task.size if task.size is not None else self.content_range(res)[1]
+                if not total == offset:
+                    return self._restart(task, part)
+            elif res.status_code == 206 and offset:
+                if not self.content_range(res)[0] == offset:
+                    return self._restart(task, part)
+                h = self._write(task, res, part, offset, 'ab')
+            elif res.status_code == 200:
+                h = self._write(task, res, part, 0, 'wb')
+            else:
+                raise DownloadError('Download failed.', res.status_code, res.reason, task.url)
+        finally:
+            res.close()
+
+        task.downloaded = os.path.getsize(part)
+        if task.size is not None and not task.downloaded == task.size:
+            raise DownloadError('Size mismatch.', task.downloaded, task.size, task.url)
+        if self.store is not None and task.key is not None:
+            digest = h.hexdigest() if h is not None else None
+            self.store.place(self.store.add(task.key, part, self.chunk_size, digest), task.path)
+            self._placed_size(task)
+        else:
+            os.replace(part, task.path)
+        task.done = True
+        return task
+
+    def _restart(self, task: DownloadTask, part: str):
+        os.remove(part)
+        return self._fetch(task)
+
+    @staticmethod
+    def content_range(res) -> tuple[int | None, int | None]:
+        # 'bytes 100-199/1000' -> (100, 1000), 'bytes */1000' -> (None, 1000)
+        value = res.headers.get('Content-Range', '')
+        unit, _, spec = value.partition(' ')
+        if not unit == 'bytes' or '/' not in spec:
+            return None, None
+        span, _, total = spec.partition('/')
+        start = span.split('-')[0]
+        return (int(start) if start.isdigit() else None,
+                int(total) if total.isdigit() else None)
+
+    @staticmethod
+    def _placed_size(task: DownloadTask):
+        size = os.path.getsize(task.path)
+        if task.size is not None and not size == task.size:
+            raise DownloadError('Size mismatch.', size, task.size, task.path)
+        return size
+
+    def _write(self, task: DownloadTask, res, part: str, offset: int, mode: str):
+        total = task.size
+        if total is None and 'Content-Length' in res.headers:
+            total = offset + int(res.headers['Content-Length'])
+        task.downloaded = offset
+        # Hash while streaming, so the store does not read the file again;
+        # on resume only the existing prefix is read back.
+        h = None
+        if self.store is not None and task.key is not None:
+            h = self.store.hasher(part if offset else None, self.chunk_size)
+        with open(part, mode) as f:
+            for chunk in res.iter_content(self.chunk_size):
+                f.write(chunk)
+                if h is not None:
+                    h.update(chunk)
+                task.downloaded += len(chunk)
+                if self.progress is not None:
+                    self.progress(task, task.downloaded, total)
+        return h
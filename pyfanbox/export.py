@@ -0,0 +1,179 @@
+import gzip
+import os
+import threading
+from typing import Any, Iterable, Iterator, Literal, Protocol, TypeVar
+
+from . import json_backend
+
+Compression = Literal['gzip', 'zstd']
+
+_RECORD = TypeVar('_RECORD')
+
+
+class _Output(Protocol):
+    def write(self, data: bytes, /) -> Any: ...
+    def flush(self) -> Any: ...
+    def close(self) -> Any: ...
+
+
+def _open(path: str, compression: Compression | None, level: int | None) -> _Output:
+    if compression is None:
+        return open(path, 'ab')
+    if compression == 'gzip':
+        return gzip.open(path, 'ab', compresslevel=6 if level is None else level)
+    if compression == 'zstd':
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return _ZstdFile(compressor.stream_writer(open(path, 'ab')), zstandard.FLUSH_BLOCK)
+    raise ValueError(f'Unknown compression "{compression}"')
+
+
+class _ZstdFile():
+    def __init__(self, writer, flush_mode: int) -> None:
+        self._writer = writer
+        self._flush_mode = flush_mode
+
+    def write(self, data: bytes):
+        return self._writer.write(data)
+
+    def flush(self):
+        # A block flush makes everything written so far decodable by streaming readers.
+        self._writer.flush(self._flush_mode)
+
+    def close(self):
+        self._writer.close()
+
+
+class JSONLWriter():
+    EXTENSIONS: dict[Compression | None, str] = {
+        None: '.jsonl',
+        'gzip': '.jsonl.gz',
+        'zstd': '.jsonl.zst',
+    }
+
+    def __init__(self, path: str, compression: Compression | None = None,
+                 level: int | None = None,
+                 max_bytes: int | None = None,
+                 max_records: int | None = None,
+                 flush_every: int = 64) -> None:
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.flush_every = flush_every
+        self.paths: list[str] = []
+        self.records = 0
+        self._fp: _Output | None = None
+        self._part = 0
+        self._part_bytes = 0
+        self._part_records = 0
+        self._unflushed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rotating(self):
+        return self.max_bytes is not None or self.max_records is not None
+
+    def _next_path(self):
+        ext = self.EXTENSIONS[self.compression]
+        if not self.rotating:
+            return self.path + ext
+        while os.path.exists(f'{self.path}-{self._part:05d}{ext}'):
+            self._part += 1
+        return f'{self.path}-{self._part:05d}{ext}'
+
+    def _rotate(self):
+        if self._fp is not None:
+            self._fp.close()
+        path = self._next_path()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._fp = _open(path, self.compression, self.level)
+        self.paths.append(path)
+        self._part_bytes = self._part_records = self._unflushed = 0
+
+    def _full(self):
+        return (self.max_bytes is not None and self._part_bytes >= self.max_bytes) \
+            or (self.max_records is not None and self._part_records >= self.max_records)
+
+    def write(self, obj: Any):
+        line = json_backend.dumps(obj) + b'\n'
+        with self._lock:
+            if self._fp is None or self._full():
+                self._rotate()
+            assert self._fp is not None
+            self._fp.write(line)
+            self.records += 1
+            self._part_records += 1
+            self._part_bytes += len(line)
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._fp.flush()
+                self._unflushed = 0
+
+    def write_all(self, objs: Iterable[Any]):
+        for obj in objs:
+            self.write(obj)
+
+    def flush(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+                self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JSONLExporter():
+    def __init__(self, directory: str, compression: Compression | None = None,
+                 level: int | None = None,
+                 max_bytes: int | None = None,
+                 max_records: int | None = None,
+                 flush_every: int = 64) -> None:
+        self.directory = directory
+        self.options = dict(compression=compression, level=level, max_bytes=max_bytes,
+                            max_records=max_records, flush_every=flush_every)
+        self.writers: dict[str, JSONLWriter] = {}
+        self._lock = threading.Lock()
+
+    def writer(self, kind: str) -> JSONLWriter:
+        with self._lock:
+            if kind not in self.writers:
+                self.writers[kind] = JSONLWriter(os.path.join(self.directory, kind),
+                                                 **self.options)  # type: ignore
+            return self.writers[kind]
+
+    def write(self, kind: str, obj: Any):
+        self.writer(kind).write(obj)
+
+    def tee(self, kind: str, objs: Iterable[_RECORD]) -> Iterator[_RECORD]:
+        writer = self.writer(kind)
+        for obj in objs:
+            writer.write(obj)
+            yield obj
+
+    def flush(self):
+        for writer in list(self.writers.values()):
+            writer.flush()
+
+    def close(self):
+        for writer in list(self.writers.values()):
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable
+
+from . import types
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS creators ('
+    'creatorId TEXT PRIMARY KEY, userId TEXT, name TEXT, description TEXT, '
+    'hasAdultContent INTEGER, isFollowed INTEGER, isSupported INTEGER, isStopped INTEGER)',
+    'CREATE TABLE IF NOT EXISTS posts ('
+    'id TEXT PRIMARY KEY, creatorId TEXT NOT NULL, title TEXT, type TEXT, '
+    'feeRequired INTEGER, publishedDatetime TEXT, updatedDatetime TEXT, '
+    'published REAL, updated REAL, isRestricted INTEGER, hasAdultContent INTEGER, '
+    'likeCount INTEGER, commentCount INTEGER, excerpt TEXT, text TEXT)',
+    'CREATE INDEX IF NOT EXISTS posts_creator ON posts (creatorId, published)',
+    'CREATE INDEX IF NOT EXISTS posts_updated ON posts (updated)',
+    'CREATE TABLE IF NOT EXISTS tags ('
+    'postId TEXT NOT NULL, tag TEXT NOT NULL, PRIMARY KEY (postId, tag)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag, postId)',
+    'CREATE TABLE IF NOT EXISTS images ('
+    'id TEXT PRIMARY KEY, postId TEXT NOT NULL, extension TEXT, width INTEGER, '
+    'height INTEGER, originalUrl TEXT, thumbnailUrl TEXT)',
+    'CREATE INDEX IF NOT EXISTS images_post ON images (postId)',
+    'CREATE TABLE IF NOT EXISTS files ('
+    'id TEXT PRIMARY KEY, postId TEXT NOT NULL, name TEXT, extension TEXT, '
+    'size INTEGER, url TEXT)',
+    'CREATE INDEX IF NOT EXISTS files_post ON files (postId)',
+    'CREATE INDEX IF NOT EXISTS files_size ON files (size)',
+    'CREATE TABLE IF NOT EXISTS comments ('
+    'id TEXT PRIMARY KEY, postId TEXT NOT NULL, parentCommentId TEXT, rootCommentId TEXT, '
+    'body TEXT, createdDatetime TEXT, likeCount INTEGER, userId TEXT, userName TEXT)',
+    'CREATE INDEX IF NOT EXISTS comments_post ON comments (postId, createdDatetime)',
+)
+
+
+def _upsert(table: str, columns: tuple[str, ...], key: str = 'id') -> str:
+    # Columns the row does not know (None) keep the value stored by an earlier, richer row.
+    updates = ', '.join(f'{c} = COALESCE(excluded.{c}, {table}.{c})'
+                        for c in columns if not c == key)
+    return (f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join("?" * len(columns))}) '
+            f'ON CONFLICT ({key}) DO UPDATE SET {updates}')
+
+
+def _value(value: Any):
+    if value is types.UNDEFINED:
+        return None
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _timestamp(value: str | None):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+class PostIndex():
+    POST_COLUMNS = ('id', 'creatorId', 'title', 'type', 'feeRequired',
+                    'publishedDatetime', 'updatedDatetime', 'published', 'updated',
+                    'isRestricted', 'hasAdultContent', 'likeCount', 'commentCount',
+                    'excerpt', 'text')
+    CREATOR_COLUMNS = ('creatorId', 'userId', 'name', 'description', 'hasAdultContent',
+                       'isFollowed', 'isSupported', 'isStopped')
+    IMAGE_COLUMNS = ('id', 'postId', 'extension', 'width', 'height',
+                     'originalUrl', 'thumbnailUrl')
+    FILE_COLUMNS = ('id', 'postId', 'name', 'extension', 'size', 'url')
+    COMMENT_COLUMNS = ('id', 'postId', 'parentCommentId', 'rootCommentId', 'body',
+                       'createdDatetime', 'likeCount', 'userId', 'userName')
+
+    def __init__(self, path: str = '.pyfanbox/index.sqlite3') -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    # === Writes ===
+
+    def add_posts(self, posts: Iterable[types._PostItem | types._PostInfo]):
+        rows: list[tuple] = []
+        tags: list[tuple[str, str]] = []
+        images: list[tuple] = []
+        files: list[tuple] = []
+        comments: list[tuple] = []
+        for post in posts:
+            rows.append(self._post_row(post))
+            tags += [(post.id, tag) for tag in post.tags]
+            if isinstance(post, types._PostInfo):
+                images += self._image_rows(post)
+                files += self._file_rows(post)
+                if post.commentList is not None:
+                    comments += self._comment_rows(post.id, post.commentList.items)
+        with self._lock:
+            with self._db:
+                self._db.executemany(_upsert('posts', self.POST_COLUMNS), rows)
+                self._db.executemany('DELETE FROM tags WHERE postId = ?',
+                                     [(row[0],) for row in rows])
+                self._db.executemany('INSERT OR IGNORE INTO tags VALUES (?, ?)', tags)
+                self._db.executemany(_upsert('images', self.IMAGE_COLUMNS), images)
+                self._db.executemany(_upsert('files', self.FILE_COLUMNS), files)
+                self._db.executemany(_upsert('comments', self.COMMENT_COLUMNS), comments)
+        return len(rows)
+
+    def add_post_info(self, info: types.APIPostInfo | types._PostInfo):
+        if isinstance(info, types.APIPostInfo):
+            info = info.body
+        return self.add_posts([info])
+
+    def add_creators(self, creators: Iterable[types._Creator | types._Payment_Creator]):
+        rows = [(c.creatorId, c.user.userId, c.user.name,
+                 _value(getattr(c, 'description', None)),
+                 _value(getattr(c, 'hasAdultContent', None)),
+                 _value(getattr(c, 'isFollowed', None)),
+                 _value(getattr(c, 'isSupported', None)),
+                 _value(getattr(c, 'isStopped', None)))
+                for c in creators]
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    _upsert('creators', self.CREATOR_COLUMNS, 'creatorId'), rows)
+        return len(rows)
+
+    def add_comments(self, postId: str, comments: Iterable[types._CommentItem]):
+        rows = self._comment_rows(postId, comments)
+        with self._lock:
+            with self._db:
+                self._db.executemany(_upsert('comments', self.COMMENT_COLUMNS), rows)
+        return len(rows)
+
+    def _post_row(self, post: types._PostItem | types._PostInfo):
+        text = None
+        if isinstance(post, types._PostInfo) and post.body is not None:
+            text = _value(post.body.text)
+        return (post.id, post.creatorId, post.title, _value(getattr(post, 'type', None)),
+                post.feeRequired, post.publishedDatetime, post.updatedDatetime,
+                _timestamp(post.publishedDatetime), _timestamp(post.updatedDatetime),
+                post.isRestricted, post.hasAdultContent, post.likeCount, post.commentCount,
+                _value(post.excerpt) or None, text)
+
+    def _image_rows(self, post: types._PostInfo):
+        body = post.body
+        if body is None:
+            return []
+        images: list[types._Image] = []
+        if not isinstance(body.images, type):
+            images += body.images
+        if not isinstance(body.imageMap, type):
+            images += body.imageMap.values()
+        return [(i.id, post.id, i.extension, i.width, i.height, i.originalUrl, i.thumbnailUrl)
+                for i in images]
+
+    def _file_rows(self, post: types._PostInfo):
+        body = post.body
+        if body is None:
+            return []
+        files: list[types._File] = []
+        if not isinstance(body.files, type):
+            files += body.files
+        if not isinstance(body.fileMap, type):
+            files += body.fileMap.values()
+        return [(f.id, post.id, f.name, f.extension, f.size, f.url) for f in files]
+
+    def _comment_rows(self, postId: str, comments: Iterable[types._CommentItem]):
+        rows: list[tuple] = []
+        for c in comments:
+            rows.append((c.id, postId, c.parentCommentId or None, c.rootCommentId or None,
+                         c.body, c.createdDatetime, c.likeCount, c.user.userId, c.user.name))
+            if not isinstance(c.replies, type):
+                rows += self._comment_rows(postId, c.replies)
+        return rows
+
+    # === Queries ===
+
+    def _query(self, sql: str, params: Iterable[Any] = ()):
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, tuple(params))]
+
+    def post(self, postId: str):
+        rows = self._query('SELECT * FROM posts WHERE id = ?', (postId,))
+        return rows[0] if rows else None
+
+    def posts(self, creatorId: str | None = None, tag: str | None = None,
+              updated_since: datetime | None = None,
+              published_since: datetime | None = None,
+              include_restricted: bool = True,
+              limit: int | None = None):
+        sql = 'SELECT posts.* FROM posts'
+        where: list[str] = []
+        params: list[Any] = []
+        if tag is not None:
+            sql += ' JOIN tags ON tags.postId = posts.id'
+            where.append('tags.tag = ?')
+            params.append(tag)
+        if creatorId is not None:
+            where.append('posts.creatorId = ?')
+            params.append(creatorId)
+        if updated_since is not None:
+            where.append('posts.updated >= ?')
+            params.append(updated_since.timestamp())
+        if published_since is not None:
+            where.append('posts.published >= ?')
+            params.append(published_since.timestamp())
+        if not include_restricted:
+            where.append('NOT posts.isRestricted')
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY posts.published DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._query(sql, params)
+
+    def tags(self, postId: str | None = None, creatorId: str | None = None):
+        if postId is not None:
+            return [r['tag'] for r in self._query(
+                'SELECT tag FROM tags WHERE postId = ? ORDER BY tag', (postId,))]
+        if creatorId is not None:
+            return self._query(
+                'SELECT tag, COUNT(*) AS count FROM tags JOIN posts ON posts.id = tags.postId '
+                'WHERE posts.creatorId = ? GROUP BY tag ORDER BY count DESC', (creatorId,))
+        return self._query('SELECT tag, COUNT(*) AS count FROM tags '
+                           'GROUP BY tag ORDER BY count DESC')
+
+    def images(self, postId: str | None = None, creatorId: str | None = None):
+        return self._media('images', postId, creatorId)
+
+    def files(self, postId: str | None = None, creatorId: str | None = None,
+              min_size: int | None = None, max_size: int | None = None):
+        return self._media('files', postId, creatorId, min_size, max_size)
+
+    def _media(self, table: str, postId: str | None, creatorId: str | None,
+               min_size: int | None = None, max_size: int | None = None):
+        sql = f'SELECT {table}.* FROM {table}'
+        where: list[str] = []
+        params: list[Any] = []
+        if creatorId is not None:
+            sql += f' JOIN posts ON posts.id = {table}.postId'
+            where.append('posts.creatorId = ?')
+            params.append(creatorId)
+        if postId is not None:
+            where.append(f'{table}.postId = ?')
+            params.append(postId)
+        if min_size is not None:
+            where.append(f'{table}.size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            where.append(f'{table}.size <= ?')
+            params.append(max_size)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._query(sql, params)
+
+    def comments(self, postId: str):
+        return self._query('SELECT * FROM comments WHERE postId = ? ORDER BY createdDatetime',
+                           (postId,))
+
+    def creator(self, creatorId: str):
+        rows = self._query('SELECT * FROM creators WHERE creatorId = ?', (creatorId,))
+        return rows[0] if rows else None
+
+    def creators(self):
+        return self._query('SELECT * FROM creators ORDER BY creatorId')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,62 @@
+import json
+from typing import IO, Any, Callable, Literal
+
+from . import types
+
+Backend = Literal['orjson', 'ujson', 'json']
+
+BACKEND: Backend = 'json'
+loads: Callable[[bytes | str], Any] = json.loads
+_dumps: Callable[[Any, bool], bytes]
+
+
+def _json_dumps(obj: Any, indent: bool) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None,
+                      default=types.encode_default).encode()
+
+
+def use(backend: Backend | None = None) -> Backend:
+    global BACKEND, loads, _dumps
+    candidates: list[Backend] = [backend] if backend is not None else ['orjson', 'ujson', 'json']
+    for name in candidates:
+        if name == 'orjson':
+            try:
+                import orjson
+            except ImportError:
+                if backend is not None:
+                    raise
+                continue
+
+            def _orjson_dumps(obj: Any, indent: bool) -> bytes:
+                return orjson.dumps(obj, default=types.encode_default,
+                                    option=orjson.OPT_INDENT_2 if indent else 0)
+            loads, _dumps = orjson.loads, _orjson_dumps
+        elif name == 'ujson':
+            try:
+                import ujson
+            except ImportError:
+                if backend is not None:
+                    raise
+                continue
+
+            def _ujson_dumps(obj: Any, indent: bool) -> bytes:
+                return ujson.dumps(obj, ensure_ascii=False, indent=2 if indent else 0,
+                                   default=types.encode_default).encode()
+            loads, _dumps = ujson.loads, _ujson_dumps
+        else:
+            loads, _dumps = json.loads, _json_dumps
+        BACKEND = name
+        return name
+    raise ValueError(f'Unknown JSON backend "{backend}"')
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    # indent=True is 2 spaces on every backend, the only width orjson supports.
+    return _dumps(obj, indent)
+
+
+def dump(obj: Any, fp: IO[bytes], indent: bool = False):
+    fp.write(_dumps(obj, indent))
+
+
+use()
@@ -1,20 +1,54 @@
-import json
-from typing import Literal
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import TYPE_CHECKING, Literal, TypeVar
 from urllib import parse
 
-import requests
+from . import json_backend, transport, types, utility
+from .cache import OfflineCacheMiss, ResponseCache
+from .scheduler import RequestScheduler
 
-from . import types, utility
+if TYPE_CHECKING:
+    import requests
+
+    from pyfanbox.aio import AsyncCC_FANBOX_API
+    from pyfanbox.metrics import Instrumentation
+
+_API_RESPONCE = TypeVar('_API_RESPONCE', bound=types.APIResponce)
 
 
 class CC_FANBOX_API():
-    def __init__(self, FANBOXSESSID: str) -> None:
-        self.sess = requests.Session()
-        self.sess.cookies.set('FANBOXSESSID', FANBOXSESSID)
-        self.sess.headers['Origin'] = 'https://www.fanbox.cc'
-        res = self.sess.get('https://api.fanbox.cc/user.countUnreadMessages')
-        if not res.status_code == 200:
-            raise RuntimeError('Could not connect to Fanbox API! (Invalid cookie "FANBOXSESSID"?)')
+    def __init__(self, FANBOXSESSID: str,
+                 cache: ResponseCache | None = None,
+                 compact: bool = False,
+                 scheduler: RequestScheduler | None = None,
+                 session: 'requests.Session | transport.HTTPXSession | None' = None,
+                 pool_size: int = 10,
+                 download_pool_size: int | None = None,
+                 coalesce: bool = True,
+                 lazy: bool = False,
+                 instrument: 'Instrumentation | None' = None) -> None:
+        self.cache = cache
+        self.compact = compact
+        self.scheduler = scheduler
+        self.instrument = instrument
+        if instrument is not None and scheduler is not None:
+            instrument.watch(scheduler)
+        self.coalesce = coalesce
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._FANBOXSESSID = FANBOXSESSID
+        self._pool_size = pool_size
+        self._download_pool_size = download_pool_size
+        self._sess = None if session is None else self._prepare_session(session)
+        # Only pools of a session created here are resized; a caller's session is left as is.
+        self._owns_session = session is None
+        self._session_lock = threading.Lock()
+        self._validate_lock = threading.Lock()
+        # Offline caches never touch the network, so there is nothing to validate.
+        self._validated = cache is not None and cache.offline
+        if not lazy:
+            self.validate()
         
         self.POST = _API_POST(self)
         self.CREATOR = _API_CREATOR(self)
@@ -26,21 +60,138 @@ class CC_FANBOX_API():
         self.PAYMENT = _API_PAYMENT(self)
         self.util = utility.utility(self)
     
+    @property
+    def sess(self) -> 'requests.Session | transport.HTTPXSession':
+        if self._sess is None:
+            with self._session_lock:
+                if self._sess is None:
+                    self._sess = self._prepare_session(
+                        transport.make_session(self._pool_size, self._download_pool_size))
+        return self._sess
+    
+    @sess.setter
+    def sess(self, session: 'requests.Session | transport.HTTPXSession'):
+        self._sess = session
+        self._owns_session = False
+    
+    def _prepare_session(self, session):
+        session.cookies.set('FANBOXSESSID', self._FANBOXSESSID)
+        session.headers['Origin'] = 'https://www.fanbox.cc'
+        return session
+    
+    def validate(self):
+        with self._validate_lock:
+            if not self._validated:
+                res = self.sess.get('https://api.fanbox.cc/user.countUnreadMessages')
+                if not res.status_code == 200:
+                    raise RuntimeError('Could not connect to Fanbox API! (Invalid cookie "FANBOXSESSID"?)')
+                self._validated = True
+        return self
+    
     def get(self, _url: str, **query) -> dict:
-        if not _url.startswith('https://'):
-            _url = 'https://api.fanbox.cc' + _url
-        if '?' not in _url and not len(query.keys()) == 0:
-            _url = _url + '?' + parse.urlencode(query, doseq=True)
-        res = self.sess.get(_url)
+        _url = self.build_url(_url, **query)
+        if self.cache is not None:
+            content = self.cache.get(_url)
+            if content is not None:
+                if self.instrument is not None:
+                    self.instrument.cache_hit(_url, len(content))
+                return self._loads(_url, content)
+            if self.cache.offline:
+                raise OfflineCacheMiss('Response is not cached.', _url)
+        if not self.coalesce:
+            return self._fetch(_url)
+
+        # Single flight: concurrent calls for the same URL share one request.
+        with self._inflight_lock:
+            flight = self._inflight.get(_url)
+            leader = flight is None
+            if flight is None:
+                flight = self._inflight[_url] = Future()
+        if not leader:
+            if self.instrument is not None:
+                self.instrument.coalesced(_url)
+            return flight.result()
+        try:
+            result = self._fetch(_url)
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[_url]
+    
+    def _fetch(self, _url: str) -> dict:
+        res = self._send(_url)
 
         if not res.status_code == 200:
             raise RuntimeError('API access failed.', res.status_code, res.reason)
-        return json.loads(res.content)
+        if self.cache is not None:
+            self.cache.put(_url, res.content)
+        return self._loads(_url, res.content)
     
-    def download(self, url, stream: bool = True):
-        res = self.sess.get(url, stream=stream)
+    def _loads(self, _url: str, content: bytes) -> dict:
+        if self.instrument is None:
+            return json_backend.loads(content)
+        with self.instrument.timer(_url, 'parse'):
+            return json_backend.loads(content)
+    
+    def request(self, cls: type[_API_RESPONCE], _url: str, **query) -> _API_RESPONCE:
+        data = self.get(_url, **query)
+        if self.instrument is None:
+            return types.decode(cls, data, self.compact)
+        with self.instrument.timer(_url, 'decode'):
+            return types.decode(cls, data, self.compact)
+    
+    def download(self, url, stream: bool = True, headers: dict[str, str] | None = None):
+        res = self._send(url, stream=stream, headers=headers)
+        return res
+    
+    def ensure_pool_size(self, size: int, download: bool = False):
+        if not self._owns_session:
+            return
+        if self._sess is None:
+            if download:
+                self._download_pool_size = max(self._download_pool_size or self._pool_size, size)
+            else:
+                self._pool_size = max(self._pool_size, size)
+            return
+        prefix = transport.DOWNLOAD_HOST if download else transport.API_HOST
+        current = transport.pool_size(self.sess, prefix)
+        if current is not None and current < size:
+            transport.mount_pool(self.sess, prefix, size)  # type: ignore
+    
+    def _send(self, url: str, **kwargs) -> 'requests.Response':
+        if not self._validated:
+            self.validate()
+        request = partial(self.sess.get if self.instrument is None else self._attempt, url, **kwargs)
+        if self.scheduler is None:
+            return request()
+        return self.scheduler.send(url, request)
+    
+    def _attempt(self, url: str, **kwargs) -> 'requests.Response':
+        # A single attempt; the scheduler reports its own waits and retries.
+        assert self.instrument is not None
+        event = self.instrument.start(url)
+        try:
+            res = self.sess.get(url, **kwargs)
+        except BaseException as e:
+            self.instrument.finish(event, error=e)
+            raise
+        # Streamed bodies are not read yet; their size comes from Content-Length.
+        size = None if kwargs.get('stream') else len(res.content)
+        self.instrument.finish(event, res.status_code, res.headers, size)
         return res
     
+    @staticmethod
+    def build_url(_url: str, **query) -> str:
+        if not _url.startswith('https://'):
+            _url = 'https://api.fanbox.cc' + _url
+        if '?' not in _url and not len(query.keys()) == 0:
+            _url = _url + '?' + parse.urlencode(query, doseq=True)
+        return _url
+    
     @staticmethod
     def parse_qs(url: str | types.URL):
         parsed = parse.urlparse(url)
@@ -49,108 +200,124 @@ class CC_FANBOX_API():
 
 
 class _CHILD_API():
-    def __init__(self, api: CC_FANBOX_API) -> None:
+    def __init__(self, api: 'CC_FANBOX_API | AsyncCC_FANBOX_API') -> None:
         self._api = api
 
 
 class _API_POST(_CHILD_API):
     def paginateCreator(self, creatorId: str):
-        return types.APIPostPaginate(
-            **self._api.get('/post.paginateCreator', creatorId=creatorId)
+        return self._api.request(
+            types.APIPostPaginate,
+            '/post.paginateCreator', creatorId=creatorId
         )
     
     def listCreator(self, creatorId: str, maxPublishedDatetime: str,
                     maxId: str, limit: int | str):
-        return types.APIPostListCreator(
-            **self._api.get('/post.listCreator',
-                            creatorId=creatorId,
-                            maxPublishedDatetime=maxPublishedDatetime,
-                            maxId=maxId,
-                            limit=limit)
+        return self._api.request(
+            types.APIPostListCreator,
+            '/post.listCreator',
+            creatorId=creatorId,
+            maxPublishedDatetime=maxPublishedDatetime,
+            maxId=maxId,
+            limit=limit
         )
 
     def info(self, postId: int | str):
-        return types.APIPostInfo(
-            **self._api.get('/post.info', postId=postId)
+        return self._api.request(
+            types.APIPostInfo,
+            '/post.info', postId=postId
         )
     
     def listComments(self, postId: int | str, limit=10):
-        return types.APIPostListComments(
-            **self._api.get('/post.listComments', postId=postId, limit=limit)
+        return self._api.request(
+            types.APIPostListComments,
+            '/post.listComments', postId=postId, limit=limit
         )
 
 
 class _API_CREATOR(_CHILD_API):
     def get(self, creatorId: str):
-        return types.APICreatorGet(
-            **self._api.get('/creator.get', creatorId=creatorId)
+        return self._api.request(
+            types.APICreatorGet,
+            '/creator.get', creatorId=creatorId
         )
     
     def listRecommended(self, limit=8):
-        return types.APICreatorList(
-            **self._api.get('/creator.listRecommended', limit=limit)
+        return self._api.request(
+            types.APICreatorList,
+            '/creator.listRecommended', limit=limit
         )
     
     def listRelated(self, userId: str | int, limit=8,
                     method: Literal['diverse'] = 'diverse'):
-        return types.APICreatorList(
-            **self._api.get('/creator.listRelated',
-                            userId=userId, limit=limit, method=method)
+        return self._api.request(
+            types.APICreatorList,
+            '/creator.listRelated',
+            userId=userId, limit=limit, method=method
         )
     
     def listFollowing(self):
-        return types.APICreatorList(
-            **self._api.get('/creator.listFollowing')
+        return self._api.request(
+            types.APICreatorList,
+            '/creator.listFollowing'
         )
 
 
 class _API_PLAN(_CHILD_API):
     def listCreator(self, creatorId: str):
-        return types.APIPlanList(
-            **self._api.get('/plan.listCreator', creatorId=creatorId)
+        return self._api.request(
+            types.APIPlanList,
+            '/plan.listCreator', creatorId=creatorId
         )
     
     def listSupporting(self):
-        return types.APIPlanList(
-            **self._api.get('/plan.listSupporting')
+        return self._api.request(
+            types.APIPlanList,
+            '/plan.listSupporting'
         )
 
 
 class _API_TAG(_CHILD_API):
     def getFeatured(self, creatorId: str):
-        return types.APITagGetFeatured(
-            **self._api.get('/tag.getFeatured', creatorId=creatorId)
+        return self._api.request(
+            types.APITagGetFeatured,
+            '/tag.getFeatured', creatorId=creatorId
         )
 
 
 class _API_BELL(_CHILD_API):
     def countUnread(self):
-        return types.APIBellCountUnread(
-            **self._api.get('/bell.countUnread')
+        return self._api.request(
+            types.APIBellCountUnread,
+            '/bell.countUnread'
         )
 
 
 class _API_USER(_CHILD_API):
     def countUnreadMessages(self):
-        return types.APIUserCountUnreadMessages(
-            **self._api.get('/user.countUnreadMessages')
+        return self._api.request(
+            types.APIUserCountUnreadMessages,
+            '/user.countUnreadMessages'
         )
 
 
 class _API_NEWSLETTER(_CHILD_API):
     def countUnreadMessages(self):
-        return types.APINewsletterCountUnread(
-            **self._api.get('/newsletter.countUnread')
+        return self._api.request(
+            types.APINewsletterCountUnread,
+            '/newsletter.countUnread'
         )
 
 
 class _API_PAYMENT(_CHILD_API):
     def listPaid(self):
-        return types.APIPaymentList(
-            **self._api.get('/payment.listPaid')
+        return self._api.request(
+            types.APIPaymentList,
+            '/payment.listPaid'
         )
     
     def listUnpaid(self):
-        return types.APIPaymentList(
-            **self._api.get('/payment.listUnpaid')
+        return self._api.request(
+            types.APIPaymentList,
+            '/payment.listUnpaid'
         )
\ No newline at end of file
@@ -0,0 +1,263 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Mapping
+from urllib import parse
+
+if TYPE_CHECKING:
+    from pyfanbox.scheduler import RequestScheduler
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def endpoint(url: str) -> str:
+    parsed = parse.urlparse(url)
+    if parsed.netloc and not parsed.netloc == 'api.fanbox.cc':
+        return 'download'
+    return parsed.path.lstrip('/')
+
+
+class RequestEvent():
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.endpoint = endpoint(url)
+        self.started = time.perf_counter()
+        self.elapsed: float | None = None
+        self.status: int | None = None
+        self.bytes: int | None = None
+        self.error: BaseException | None = None
+
+
+class Histogram():
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets: tuple[float, ...] | None = None) -> None:
+        self.buckets = self.BUCKETS if buckets is None else buckets
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': dict(zip([*self.buckets, float('inf')], self.counts)),
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95)}
+
+
+class Metrics():
+    def __init__(self, buckets: tuple[float, ...] | None = None) -> None:
+        self.buckets = buckets
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        key = (endpoint, phase)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name: str, n: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def counter(self, name: str, **labels: str) -> float:
+        if labels:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+        return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': {f'{e}:{p}': h.snapshot() for (e, p), h in self.histograms.items()},
+                'counters': {name + (str(dict(labels)) if labels else ''): v
+                             for (name, labels), v in self.counters.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def prometheus(self, prefix: str = 'pyfanbox') -> str:
+        lines: list[str] = []
+        with self._lock:
+            if self.histograms:
+                name = f'{prefix}_request_seconds'
+                lines.append(f'# HELP {name} Time by endpoint and phase '
+                             '(network, throttle, backoff, parse, decode).')
+                lines.append(f'# TYPE {name} histogram')
+            for (e, p), h in sorted(self.histograms.items()):
+                series = f'endpoint="{_escape(e)}",phase="{p}"'
+                cumulative = 0
+                for bound, n in zip([*h.buckets, float('inf')], h.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{series},le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{series}}} {h.sum}')
+                lines.append(f'{name}_count{{{series}}} {h.count}')
+            typed: set[str] = set()
+            for (counter, labels), v in sorted(self.counters.items()):
+                name = f'{prefix}_{counter}_total'
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                text = ','.join(f'{k}="{_escape(str(val))}"' for k, val in labels)
+                lines.append(f'{name}{{{text}}} {v}' if text else f'{name} {v}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation():
+    def __init__(self, metrics: Metrics | None = None) -> None:
+        self.metrics = Metrics() if metrics is None else metrics
+        # Anything with observe(endpoint, phase, seconds) and count(name, n, **labels).
+        self.sinks: list[Any] = [self.metrics]
+        self.before: list[Callable[[RequestEvent], None]] = []
+        self.after: list[Callable[[RequestEvent], None]] = []
+
+    def before_request(self, hook: Callable[[RequestEvent], None]):
+        self.before.append(hook)
+        return hook
+
+    def after_request(self, hook: Callable[[RequestEvent], None]):
+        self.after.append(hook)
+        return hook
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        for sink in self.sinks:
+            sink.observe(endpoint, phase, seconds)
+
+    def count(self, name: str, n: float = 1, **labels: str):
+        for sink in self.sinks:
+            sink.count(name, n, **labels)
+
+    @contextmanager
+    def timer(self, url: str, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(endpoint(url), phase, time.perf_counter() - start)
+
+    def start(self, url: str) -> RequestEvent:
+        event = RequestEvent(url)
+        for hook in self.before:
+            hook(event)
+        return event
+
+    def finish(self, event: RequestEvent, status: int | None = None,
+               headers: Mapping[str, str] | None = None,
+               size: int | None = None,
+               error: BaseException | None = None):
+        event.elapsed = time.perf_counter() - event.started
+        event.status = status
+        event.error = error
+        if size is None and headers is not None and 'Content-Length' in headers:
+            size = int(headers['Content-Length'])
+        event.bytes = size
+
+        self.observe(event.endpoint, 'network', event.elapsed)
+        self.count('requests', endpoint=event.endpoint)
+        if status is not None:
+            self.count('responses', endpoint=event.endpoint, status=str(status))
+        if error is not None or status is None or status >= 400:
+            self.count('errors', endpoint=event.endpoint)
+        if size:
+            self.count('bytes', size, endpoint=event.endpoint)
+        for hook in self.after:
+            hook(event)
+
+    def cache_hit(self, url: str, size: int):
+        self.count('cache_hits', endpoint=endpoint(url))
+        self.count('cache_bytes', size, endpoint=endpoint(url))
+
+    def coalesced(self, url: str):
+        self.count('coalesced', endpoint=endpoint(url))
+
+    def watch(self, scheduler: 'RequestScheduler'):
+        # Each attempt is timed as its own request; waits in the scheduler get their own phases.
+        if self.retry not in scheduler.on_retry:
+            scheduler.on_retry.append(self.retry)
+            scheduler.on_throttle.append(self.throttle)
+        return self
+
+    def retry(self, url: str, attempt: int, status: int | None, delay: float):
+        self.count('retries', endpoint=endpoint(url),
+                   reason=str(status) if status is not None else 'error')
+        self.observe(endpoint(url), 'backoff', delay)
+
+    def throttle(self, url: str, seconds: float):
+        self.observe(endpoint(url), 'throttle', seconds)
+
+
+def serve_prometheus(metrics: Metrics, port: int = 9464, host: str = '127.0.0.1'):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            content = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class OpenTelemetrySink():
+    def __init__(self, meter: Any = None, prefix: str = 'pyfanbox') -> None:
+        from opentelemetry import metrics as otel_metrics
+        self.prefix = prefix
+        self.meter = otel_metrics.get_meter('pyfanbox') if meter is None else meter
+        self.duration = self.meter.create_histogram(
+            f'{prefix}.request.duration', unit='s',
+            description='Time by endpoint and phase (network, throttle, backoff, parse, decode).')
+        self.counters: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        self.duration.record(seconds, {'endpoint': endpoint, 'phase': phase})
+
+    def count(self, name: str, n: float = 1, **labels: str):
+        counter = self.counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self.counters.get(name)
+                if counter is None:
+                    counter = self.counters[name] = self.meter.create_counter(f'{self.prefix}.{name}')
+        counter.add(n, labels)
+
+    def attach(self, instrument: Instrumentation):
+        instrument.sinks.append(self)
+        return self
@@ -0,0 +1,423 @@
+import hashlib
+import os
+from html import escape
+from typing import IO, Any, Callable, Iterator
+
+from . import types
+from .download import DownloadManager
+
+UNDEFINED = types.UNDEFINED
+
+Write = Callable[[str], Any]
+
+
+class Renderer():
+    name = 'text'
+    extension = '.txt'
+    # Model class -> handler name. Order matters: lookups fall back to the
+    # first entry the block is a subclass of, like an isinstance chain.
+    BLOCKS: dict[type, str] = {}
+    URL_EMBEDS: dict[type, str] = {}
+
+    def __init__(self, media_dir: str | None = None) -> None:
+        self.media_dir = media_dir
+        self._blocks: dict[type, Callable] = {}
+        self._url_embeds: dict[type, Callable] = {}
+
+    def cache_key(self):
+        return f'{type(self).__qualname__}:{self.media_dir}'
+
+    def media_path(self, item: types._Image | types._File) -> str | None:
+        # Local path of a downloaded image or file, named like DownloadManager saves it.
+        if self.media_dir is None:
+            return None
+        if isinstance(item, types._Image):
+            filename = DownloadManager.image_filename(item)
+        else:
+            filename = DownloadManager.file_filename(item)
+        return os.path.join(self.media_dir, filename).replace(os.sep, '/')
+
+    def media_url(self, item: types._Image | types._File) -> str:
+        path = self.media_path(item)
+        if path is not None:
+            return path
+        return item.originalUrl if isinstance(item, types._Image) else item.url
+
+    @staticmethod
+    def find_image(body: types._PostInfoBody, imageId: str) -> types._Image | None:
+        return None if isinstance(body.imageMap, type) else body.imageMap.get(imageId)
+
+    @staticmethod
+    def find_file(body: types._PostInfoBody, fileId: str) -> types._File | None:
+        return None if isinstance(body.fileMap, type) else body.fileMap.get(fileId)
+
+    def _handler(self, table: dict[type, str], cache: dict[type, Callable], cls: type,
+                 default: str):
+        handler = cache.get(cls)
+        if handler is None:
+            name = table.get(cls)
+            if name is None:
+                name = next((v for k, v in table.items() if issubclass(cls, k)), default)
+            handler = cache[cls] = getattr(self, name)
+        return handler
+
+    def render(self, body: types._PostInfoBody, creatorId: str) -> str:
+        out: list[str] = []
+        self.write(body, creatorId, out.append)
+        return ''.join(out)
+
+    def render_to(self, body: types._PostInfoBody, creatorId: str, fp: IO[str]):
+        self.write(body, creatorId, fp.write)
+
+    def write(self, body: types._PostInfoBody, creatorId: str, write: Write):
+        if isinstance(body.blocks, type):
+            return self.write_plain_body(body, write)
+        handlers = self._blocks
+        for block in body.blocks:
+            handler = handlers.get(type(block))
+            if handler is None:
+                handler = self._handler(self.BLOCKS, handlers, type(block), 'unknown_block')
+            handler(block, body, creatorId, write)
+
+    def url_embed(self, block: types._ArticleURLEmbedBlock, body: types._PostInfoBody,
+                  creatorId: str, write: Write):
+        if isinstance(body.urlEmbedMap, type):
+            raise AttributeError('body.urlEmbedMap is not defined!')
+        urlEmbed = body.urlEmbedMap[block.urlEmbedId]
+        handler = self._handler(self.URL_EMBEDS, self._url_embeds, type(urlEmbed),
+                                'unknown_url_embed')
+        handler(urlEmbed, creatorId, write)
+
+    # Placeholders are kept unless media_dir says where the downloads live.
+    def image(self, block: types._ArticleImageBlock, body: types._PostInfoBody,
+              creatorId: str, write: Write):
+        image = self.find_image(body, block.imageId) if self.media_dir is not None else None
+        if image is None:
+            write('{image:' + block.imageId + '}\n\n')
+        else:
+            self.attachment(image, write)
+
+    def file(self, block: types._ArticleFileBlock, body: types._PostInfoBody,
+             creatorId: str, write: Write):
+        file = self.find_file(body, block.fileId) if self.media_dir is not None else None
+        if file is None:
+            write('{file:' + block.fileId + '}\n\n')
+        else:
+            self.attachment(file, write)
+
+    # Image and file posts carry a caption plus attachments instead of blocks.
+    def write_plain_body(self, body: types._PostInfoBody, write: Write):
+        if isinstance(body.text, str) and body.text:
+            self.caption(body.text, write)
+        if not isinstance(body.images, type):
+            for image in body.images:
+                self.attachment(image, write)
+        if not isinstance(body.files, type):
+            for file in body.files:
+                self.attachment(file, write)
+
+    def caption(self, text: str, write: Write):
+        write(text + '\n\n')
+
+    def attachment(self, item: types._Image | types._File, write: Write):
+        write(self.media_url(item) + '\n\n')
+
+
+class MarkdownRenderer(Renderer):
+    name = 'markdown'
+    extension = '.md'
+    BLOCKS = {
+        types._ArticleParagraphBlock: 'paragraph',
+        types._ArticleHeaderBlock: 'header',
+        types._ArticleImageBlock: 'image',
+        types._ArticleFileBlock: 'file',
+        types._ArticleURLEmbedBlock: 'url_embed',
+    }
+    URL_EMBEDS = {
+        types._UrlEmbedDefault: 'embed_default',
+        types._UrlEmbedHtml: 'embed_html',
+        types._UrlEmbedFanboxCreator: 'embed_creator',
+        types._UrlEmbedFanboxPost: 'embed_post',
+    }
+
+    def paragraph(self, block: types._ArticleParagraphBlock, body: types._PostInfoBody,
+                  creatorId: str, write: Write):
+        text = block.text
+        styles, links = block.styles, block.links
+        if not styles and not links or styles is UNDEFINED and links is UNDEFINED:
+            write(text + '\n\n')
+            return
+        # Offset -> markup, built in one pass over styles and then links.
+        # Earlier entries win on shared offsets, and a link joins a bold marker there.
+        insertion: dict[int, str] = {}
+        if isinstance(styles, list):
+            for style in reversed(styles):
+                insertion[style.offset] = ' **'
+                insertion[style.offset + style.length] = '** '
+        if isinstance(links, list):
+            for link in reversed(links):
+                b = link.offset
+                e = b + link.length
+                mark = insertion.get(b)
+                insertion[b] = mark + '[' if mark == ' **' or mark == '** ' else '['
+                mark = insertion.get(e)
+                close = '](' + link.url + ')'
+                insertion[e] = close + mark if mark == ' **' or mark == '** ' else close
+        parts = []
+        prev = 0
+        for k in sorted(insertion):
+            parts.append(text[prev:k])
+            parts.append(insertion[k])
+            prev = k
+        parts.append(text[prev:])
+        parts.append('\n\n')
+        write(''.join(parts))
+
+    def header(self, block: types._ArticleHeaderBlock, body: types._PostInfoBody,
+               creatorId: str, write: Write):
+        write('\n\n### ' + block.text + '\n\n')
+
+    def attachment(self, item: types._Image | types._File, write: Write):
+        if isinstance(item, types._Image):
+            write(f'![{item.id}]({self.media_url(item)})\n\n')
+        else:
+            write(f'[{item.name}.{item.extension}]({self.media_url(item)})\n\n')
+
+    def unknown_block(self, block: Any, body: types._PostInfoBody,
+                      creatorId: str, write: Write):
+        write('! - UNKNOWN FORMAT OF BLOCK - !\n\n')
+
+    def embed_default(self, urlEmbed: types._UrlEmbedDefault, creatorId: str, write: Write):
+        write(f'[{urlEmbed.url}]({urlEmbed.url})\n\n')
+
+    def embed_html(self, urlEmbed: types._UrlEmbedHtml, creatorId: str, write: Write):
+        write(urlEmbed.html)
+
+    def embed_creator(self, urlEmbed: types._UrlEmbedFanboxCreator, creatorId: str,
+                      write: Write):
+        url = 'https://' + urlEmbed.profile.creatorId + '.fanbox.cc/'
+        write(f'[FANBOX CREATOR]({url})\n\n')
+
+    def embed_post(self, urlEmbed: types._UrlEmbedFanboxPost, creatorId: str, write: Write):
+        url = 'https://' + creatorId + '.fanbox.cc/posts/' + urlEmbed.postInfo.id
+        write(f'[FANBOX POST]({url})\n\n')
+
+    def unknown_url_embed(self, urlEmbed: Any, creatorId: str, write: Write):
+        write('! - UNKNOWN FORMAT OF URL EMBED - !\n\n')
+
+
+
+class HTMLRenderer(Renderer):
+    name = 'html'
+    extension = '.html'
+    BLOCKS = MarkdownRenderer.BLOCKS
+    URL_EMBEDS = MarkdownRenderer.URL_EMBEDS
+
+    @staticmethod
+    def spans(block: types._ArticleParagraphBlock) -> Iterator[tuple[str, bool, str | None]]:
+        # (text, bold, link url) runs, from a sweep over style and link boundaries.
+        text = block.text
+        styles = block.styles if isinstance(block.styles, list) else []
+        links = block.links if isinstance(block.links, list) else []
+        if not styles and not links:
+            yield text, False, None
+            return
+        n = len(text)
+        changes: dict[int, list[tuple[int, str | None]]] = {0: [], n: []}
+        bounds: list[tuple[int, int, str | None]] = [(s.offset, s.length, None) for s in styles]
+        bounds += [(link.offset, link.length, link.url) for link in links]
+        for offset, length, url in bounds:
+            b = min(max(offset, 0), n)
+            e = min(max(offset + length, b), n)
+            changes.setdefault(b, []).append((1, url))
+            changes.setdefault(e, []).append((-1, url))
+        bold = 0
+        active: list[str] = []
+        start = prev = 0
+        state: tuple[bool, str | None] = (False, None)
+        for pos in sorted(changes):
+            if pos > prev:
+                current = (bold > 0, active[-1] if active else None)
+                # Runs that touch with the same markup are emitted as one.
+                if not current == state and prev > start:
+                    yield text[start:prev], *state
+                    start = prev
+                state = current
+            for delta, url in changes[pos]:
+                if url is None:
+                    bold += delta
+                elif delta > 0:
+                    active.append(url)
+                else:
+                    active.remove(url)
+            prev = pos
+        if prev > start:
+            yield text[start:prev], *state
+
+    def paragraph(self, block: types._ArticleParagraphBlock, body: types._PostInfoBody,
+                  creatorId: str, write: Write):
+        parts = ['<p>']
+        for text, bold, url in self.spans(block):
+            text = escape(text, False).replace('\n', '<br>\n')
+            if bold:
+                text = '<strong>' + text + '</strong>'
+            if url is not None:
+                text = f'<a href="{escape(url)}">{text}</a>'
+            parts.append(text)
+        parts.append('</p>\n')
+        write(''.join(parts))
+
+    def header(self, block: types._ArticleHeaderBlock, body: types._PostInfoBody,
+               creatorId: str, write: Write):
+        write('<h3>' + escape(block.text, False) + '</h3>\n')
+
+    def image(self, block: types._ArticleImageBlock, body: types._PostInfoBody,
+              creatorId: str, write: Write):
+        image = self.find_image(body, block.imageId)
+        if image is None:
+            write(f'<!-- image {escape(block.imageId)} -->\n')
+        else:
+            self.attachment(image, write)
+
+    def file(self, block: types._ArticleFileBlock, body: types._PostInfoBody,
+             creatorId: str, write: Write):
+        file = self.find_file(body, block.fileId)
+        if file is None:
+            write(f'<!-- file {escape(block.fileId)} -->\n')
+        else:
+            self.attachment(file, write)
+
+    def unknown_block(self, block: Any, body: types._PostInfoBody,
+                      creatorId: str, write: Write):
+        write('<!-- unknown block -->\n')
+
+    def caption(self, text: str, write: Write):
+        write('<p>' + escape(text, False).replace('\n', '<br>\n') + '</p>\n')
+
+    def attachment(self, item: types._Image | types._File, write: Write):
+        url = escape(self.media_url(item))
+        if isinstance(item, types._Image):
+            write(f'<figure><img src="{url}" width="{item.width}" height="{item.height}" '
+                  f'loading="lazy"></figure>\n')
+        else:
+            name = escape(f'{item.name}.{item.extension}', False)
+            write(f'<p><a href="{url}" download>{name}</a></p>\n')
+
+    def link(self, url: str, text: str, write: Write):
+        write(f'<p><a href="{escape(url)}">{escape(text, False)}</a></p>\n')
+
+    def embed_default(self, urlEmbed: types._UrlEmbedDefault, creatorId: str, write: Write):
+        self.link(urlEmbed.url, urlEmbed.url, write)
+
+    def embed_html(self, urlEmbed: types._UrlEmbedHtml, creatorId: str, write: Write):
+        write(urlEmbed.html + '\n')
+
+    def embed_creator(self, urlEmbed: types._UrlEmbedFanboxCreator, creatorId: str,
+                      write: Write):
+        self.link('https://' + urlEmbed.profile.creatorId + '.fanbox.cc/', 'FANBOX CREATOR', write)
+
+    def embed_post(self, urlEmbed: types._UrlEmbedFanboxPost, creatorId: str, write: Write):
+        self.link('https://' + creatorId + '.fanbox.cc/posts/' + urlEmbed.postInfo.id,
+                  'FANBOX POST', write)
+
+    def unknown_url_embed(self, urlEmbed: Any, creatorId: str, write: Write):
+        write('<!-- unknown url embed -->\n')
+
+
+class PlainRenderer(Renderer):
+    name = 'plain'
+    extension = '.txt'
+    BLOCKS = MarkdownRenderer.BLOCKS
+    URL_EMBEDS = MarkdownRenderer.URL_EMBEDS
+
+    def paragraph(self, block: types._ArticleParagraphBlock, body: types._PostInfoBody,
+                  creatorId: str, write: Write):
+        write(block.text + '\n\n')
+
+    def header(self, block: types._ArticleHeaderBlock, body: types._PostInfoBody,
+               creatorId: str, write: Write):
+        write(block.text + '\n\n')
+
+    def unknown_block(self, block: Any, body: types._PostInfoBody,
+                      creatorId: str, write: Write):
+        pass
+
+    def embed_default(self, urlEmbed: types._UrlEmbedDefault, creatorId: str, write: Write):
+        write(urlEmbed.url + '\n\n')
+
+    def embed_html(self, urlEmbed: types._UrlEmbedHtml, creatorId: str, write: Write):
+        pass
+
+    def embed_creator(self, urlEmbed: types._UrlEmbedFanboxCreator, creatorId: str,
+                      write: Write):
+        write('https://' + urlEmbed.profile.creatorId + '.fanbox.cc/\n\n')
+
+    def embed_post(self, urlEmbed: types._UrlEmbedFanboxPost, creatorId: str, write: Write):
+        write('https://' + creatorId + '.fanbox.cc/posts/' + urlEmbed.postInfo.id + '\n\n')
+
+    def unknown_url_embed(self, urlEmbed: Any, creatorId: str, write: Write):
+        pass
+
+
+RENDERERS: dict[str, type[Renderer]] = {
+    'markdown': MarkdownRenderer,
+    'html': HTMLRenderer,
+    'plain': PlainRenderer,
+}
+
+
+def get_renderer(name: str, media_dir: str | None = None) -> Renderer:
+    if name not in RENDERERS:
+        raise ValueError(f'Unknown renderer "{name}"')
+    return RENDERERS[name](media_dir)
+
+
+class RenderCache():
+    def __init__(self, directory: str = '.pyfanbox/render') -> None:
+        self.directory = directory
+
+    def path(self, post: types._PostInfo, renderer: Renderer):
+        key = hashlib.sha1(f'{post.updatedDatetime}\0{renderer.cache_key()}'.encode()).hexdigest()
+        return os.path.join(self.directory, post.id, f'{renderer.name}-{key[:16]}{renderer.extension}')
+
+    def get(self, post: types._PostInfo, renderer: Renderer) -> str | None:
+        try:
+            with open(self.path(post, renderer), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, post: types._PostInfo, renderer: Renderer, text: str):
+        path = self.path(post, renderer)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Drop renders of older revisions of this post in the same format.
+        prefix = renderer.name + '-'
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith(renderer.extension):
+                os.remove(os.path.join(directory, name))
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+def render_post(post: types.APIPostInfo | types._PostInfo, renderer: Renderer | None = None,
+                cache: RenderCache | None = None) -> str:
+    if isinstance(post, types.APIPostInfo):
+        post = post.body
+    if renderer is None:
+        renderer = markdown
+    if post.body is None:
+        return ''
+    if cache is not None:
+        text = cache.get(post, renderer)
+        if text is not None:
+            return text
+    text = renderer.render(post.body, post.creatorId)
+    if cache is not None:
+        cache.put(post, renderer, text)
+    return text
+
+
+markdown = MarkdownRenderer()
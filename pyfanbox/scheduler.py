@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Mapping, TypeVar
+from urllib import parse
+
+_RESPONSE = TypeVar('_RESPONSE')
+
+
+class TokenBucket():
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RequestScheduler():
+    DEFAULT_RATES: dict[str, tuple[float, int]] = {
+        'post': (2.0, 4),
+        'creator': (1.0, 2),
+        'plan': (1.0, 2),
+        'tag': (1.0, 2),
+        'download': (8.0, 8),
+    }
+
+    def __init__(self, rates: Mapping[str, tuple[float, int]] | None = None,
+                 default_rate: tuple[float, int] = (1.0, 2),
+                 max_retries: int = 5,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 retry_statuses: tuple[int, ...] = (429, 500, 502, 503, 504)) -> None:
+        self.rates = dict(self.DEFAULT_RATES)
+        if rates is not None:
+            self.rates.update(rates)
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+        self.buckets: dict[str, TokenBucket] = {}
+        # Called as hook(url, attempt, status, delay); status is None for connection errors.
+        self.on_retry: list[Callable[[str, int, int | None, float], None]] = []
+        # Called as hook(url, seconds) when a request waits for its rate limit.
+        self.on_throttle: list[Callable[[str, float], None]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def family(url: str) -> str:
+        parsed = parse.urlparse(url)
+        if not parsed.netloc == 'api.fanbox.cc':
+            return 'download'
+        return parsed.path.lstrip('/').split('.')[0]
+
+    def bucket(self, family: str) -> TokenBucket:
+        with self._lock:
+            if family not in self.buckets:
+                self.buckets[family] = TokenBucket(*self.rates.get(family, self.default_rate))
+            return self.buckets[family]
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(headers: Mapping[str, str]) -> float | None:
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _retry_delay(self, url: str, bucket: TokenBucket, attempt: int,
+                     status: int | None, headers: Mapping[str, str]) -> float | None:
+        if attempt >= self.max_retries:
+            return None
+        if status is not None and status not in self.retry_statuses:
+            return None
+        delay = self.retry_after(headers) if status is not None else None
+        if delay is None:
+            delay = self.backoff(attempt)
+        if status == 429:
+            bucket.pause(delay)
+        for hook in self.on_retry:
+            hook(url, attempt, status, delay)
+        return delay
+
+    def send(self, url: str, request: Callable[[], Any],
+             retry_on: tuple[type[BaseException], ...] = (OSError,)) -> Any:
+        bucket = self.bucket(self.family(url))
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                for hook in self.on_throttle:
+                    hook(url, wait)
+                time.sleep(wait)
+            try:
+                res = request()
+            except retry_on:
+                delay = self._retry_delay(url, bucket, attempt, None, {})
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(url, bucket, attempt, res.status_code, res.headers)
+                if delay is None:
+                    return res
+                res.close()
+            time.sleep(delay)
+            attempt += 1
+
+    async def send_async(self, url: str, request: Callable[[], Awaitable[_RESPONSE]],
+                         retry_on: tuple[type[BaseException], ...] = (OSError,)) -> _RESPONSE:
+        import asyncio
+        bucket = self.bucket(self.family(url))
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                for hook in self.on_throttle:
+                    hook(url, wait)
+                await asyncio.sleep(wait)
+            try:
+                res: Any = await request()
+            except retry_on:
+                delay = self._retry_delay(url, bucket, attempt, None, {})
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(url, bucket, attempt, res.status, res.headers)
+                if delay is None:
+                    return res
+                res.release()
+            await asyncio.sleep(delay)
+            attempt += 1
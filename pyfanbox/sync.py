@@ -0,0 +1,87 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterator
+
+from . import types
+
+if TYPE_CHECKING:
+    from pyfanbox.main import CC_FANBOX_API
+
+
+class SyncState():
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.posts: dict[str, dict] = {}
+        self.lastSync: str | None = None
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.posts = data.get('posts', {})
+            self.lastSync = data.get('lastSync')
+
+    def is_changed(self, post: types._PostItem):
+        seen = self.posts.get(post.id)
+        return seen is None \
+            or not seen['updatedDatetime'] == post.updatedDatetime \
+            or not seen['isRestricted'] == post.isRestricted
+
+    def mark(self, post: types._PostItem):
+        self.posts[post.id] = {'updatedDatetime': post.updatedDatetime,
+                               'isRestricted': post.isRestricted}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'posts': self.posts, 'lastSync': self.lastSync}, f)
+        os.replace(tmp, self.path)
+
+
+class IncrementalSync():
+    def __init__(self, api: 'CC_FANBOX_API', state_dir: str = '.pyfanbox/sync',
+                 stop_after: int = 1, include_restricted: bool = False) -> None:
+        self._api = api
+        self.state_dir = state_dir
+        self.stop_after = stop_after
+        self.include_restricted = include_restricted
+
+    def state(self, creatorId: str):
+        return SyncState(os.path.join(self.state_dir, creatorId + '.json'))
+
+    def changed_posts(self, creatorId: str, state: SyncState | None = None):
+        if state is None:
+            state = self.state(creatorId)
+        changed: list[types._PostItem] = []
+        unchanged = 0
+
+        posts = self._api.util.iter_posts(creatorId)
+        for post in posts:
+            if state.is_changed(post):
+                changed.append(post)
+                unchanged = 0
+                continue
+            unchanged += 1
+            if unchanged >= self.stop_after:
+                posts.close()
+                break
+        return changed
+
+    def sync(self, creatorId: str) -> Iterator[tuple[types._PostItem, types.APIPostInfo | None]]:
+        state = self.state(creatorId)
+        # Oldest first, so an interrupted run never leaves a gap below a marked post.
+        changed = list(reversed(self.changed_posts(creatorId, state)))
+        try:
+            for post in changed:
+                info = None
+                if self.include_restricted or not post.isRestricted:
+                    info = self._api.POST.info(post.id)
+                yield post, info
+                # Marked once the consumer asks for the next post, so a post whose
+                # processing failed is synced again on the next run.
+                state.mark(post)
+            state.lastSync = datetime.now(timezone(timedelta(hours=9))).isoformat()
+        finally:
+            state.save()
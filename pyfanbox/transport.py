@@ -0,0 +1,80 @@
+from typing import TYPE_CHECKING, Any, Iterator
+
+if TYPE_CHECKING:
+    import requests
+
+API_HOST = 'https://api.fanbox.cc'
+DOWNLOAD_HOST = 'https://downloads.fanbox.cc'
+
+
+def make_session(pool_size: int = 10, download_pool_size: int | None = None,
+                 pool_block: bool = False) -> 'requests.Session':
+    # requests is imported on first use so that importing pyfanbox stays cheap.
+    import requests
+    sess = requests.Session()
+    sess.headers['Connection'] = 'keep-alive'
+    mount_pool(sess, API_HOST, pool_size, pool_block)
+    mount_pool(sess, DOWNLOAD_HOST, download_pool_size or pool_size, pool_block)
+    return sess
+
+
+def mount_pool(sess: 'requests.Session', prefix: str, size: int, pool_block: bool = False):
+    from requests.adapters import HTTPAdapter
+    replaced = sess.adapters.get(prefix)
+    sess.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=pool_block))
+    if replaced is not None:
+        # Idle connections close now; ones in use are closed when they are released.
+        replaced.close()
+
+
+def pool_size(sess: Any, prefix: str) -> int | None:
+    import requests
+    if not isinstance(sess, requests.Session):
+        return None
+    adapter = sess.get_adapter(prefix + '/')
+    return getattr(adapter, '_pool_maxsize', None)
+
+
+class HTTPXSession():
+    def __init__(self, pool_size: int = 10, http2: bool = True, **client_options) -> None:
+        import httpx
+        self.client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            **client_options
+        )
+
+    @property
+    def cookies(self):
+        return self.client.cookies
+
+    @property
+    def headers(self):
+        return self.client.headers
+
+    def get(self, url: str, stream: bool = False, headers: dict[str, str] | None = None):
+        request = self.client.build_request('GET', url, headers=headers)
+        return HTTPXResponse(self.client.send(request, stream=stream))
+
+    def close(self):
+        self.client.close()
+
+
+class HTTPXResponse():
+    def __init__(self, res) -> None:
+        self._res = res
+        self.status_code: int = res.status_code
+        self.reason: str = res.reason_phrase
+        self.headers = res.headers
+        self.url = str(res.url)
+
+    @property
+    def content(self) -> bytes:
+        return self._res.read()
+
+    def iter_content(self, chunk_size: int | None = None) -> Iterator[bytes]:
+        return self._res.iter_bytes(chunk_size)
+
+    def close(self):
+        self._res.close()
@@ -1,6 +1,14 @@
+import ast
+import inspect
 import json
+import sys
+import textwrap
 import warnings
-from typing import Any, Literal, NewType, Type, TypeVar, TypedDict, overload
+from abc import ABCMeta
+from collections import Counter
+from functools import partial
+from typing import (Any, Callable, Generic, Literal, NewType, Type, TypeVar,
+                    TypedDict, overload)
 
 from . import pyfanbox_enum as pfenum
 
@@ -12,6 +20,7 @@ ISODateTime = NewType('ISODateTime', str)
 _API_RESPONCE = TypeVar('_API_RESPONCE')
 _ENUM_LIKE = TypeVar('_ENUM_LIKE')
 _ENUM_VAL = TypeVar('_ENUM_VAL')
+_LAZY_VALUE = TypeVar('_LAZY_VALUE')
 
 
 @overload
@@ -25,15 +34,13 @@ def maplist(__list: None, cls: Any) -> None: ...
 def maplist(__list: None | Type[UNDEFINED] | list[dict[Any, Any]],
             cls: Type[_API_RESPONCE]
             ) -> None | Type[UNDEFINED] | list[_API_RESPONCE]:
-    if isinstance(__list, type):
-        if __list == UNDEFINED:
-            return UNDEFINED
-        else:
-            raise ValueError(f'arg "__list" allow "None or UNDEFINED or dict" but get "{type(__list)}"')
-    elif __list is None:
-        return None
+    if __list is None or __list is UNDEFINED:
+        return __list
+    elif isinstance(__list, type):
+        raise ValueError(f'arg "__list" allow "None or UNDEFINED or dict" but get "{type(__list)}"')
     else:
-        return list(map(lambda x: cls(**x), __list))
+        decode = decoder(cls)
+        return [decode(x) for x in __list]
 
 
 @overload
@@ -47,15 +54,13 @@ def mapdict(__dict: None, cls: Any) -> None: ...
 def mapdict(__dict: dict[str, dict[Any, Any]] | Type[UNDEFINED] | None,
             cls: Type[_API_RESPONCE]
             ) -> None | Type[UNDEFINED] | dict[str, _API_RESPONCE]:
-    if isinstance(__dict, type):
-        if __dict == UNDEFINED:
-            return UNDEFINED
-        else:
-            raise ValueError(f'arg "__dict" allow "None or UNDEFINED or dict" but get "{type(__dict)}"')
-    elif __dict is None:
-        return None
+    if __dict is None or __dict is UNDEFINED:
+        return __dict
+    elif isinstance(__dict, type):
+        raise ValueError(f'arg "__dict" allow "None or UNDEFINED or dict" but get "{type(__dict)}"')
     else:
-        return {k: cls(**v) for k, v in __dict.items()}
+        decode = decoder(cls)
+        return {k: decode(v) for k, v in __dict.items()}
 
 
 @overload
@@ -69,15 +74,12 @@ def setclass(__dict: None, cls: Any) -> None: ...
 def setclass(__dict: None | Type[UNDEFINED] | dict[Any, Any],
              cls: Type[_API_RESPONCE]
              ) -> None | Type[UNDEFINED] | _API_RESPONCE:
-    if isinstance(__dict, type):
-        if __dict == UNDEFINED:
-            return UNDEFINED
-        else:
-            raise ValueError(f'arg "__dict" allow "None or UNDEFINED or dict" but get "{type(__dict)}"')
-    elif __dict is None:
-        return None
+    if __dict is None or __dict is UNDEFINED:
+        return __dict
+    elif isinstance(__dict, type):
+        raise ValueError(f'arg "__dict" allow "None or UNDEFINED or dict" but get "{type(__dict)}"')
     else:
-        return cls(**__dict)
+        return decoder(cls)(__dict)
 
 
 @overload
@@ -90,16 +92,193 @@ def safe_enum(val: None, enum: Any) -> None: ...
 
 def safe_enum(val: None | Type[UNDEFINED] | _ENUM_VAL, enum: Type[_ENUM_LIKE]
               ) -> None | Type[UNDEFINED] | _ENUM_LIKE | _ENUM_VAL:
-    if val == UNDEFINED:
-        return UNDEFINED
-    elif val is None:
-        return None
-    else:
-        try:
-            return enum(val)
-        except ValueError:
-            warnings.warn(f"SafeEnum: '{val}' is not a valid {enum.__name__}. Assignd {type(val)} value.")
-            return val
+    if val is None or val is UNDEFINED:
+        return val
+    try:
+        return enum._value2member_map_[val]  # type: ignore
+    except (KeyError, TypeError):
+        pass
+    try:
+        return enum(val)
+    except ValueError:
+        # Counted per enum rather than per value, since free-text fields would otherwise
+        # add a warning and an entry for every object.
+        samples = UNKNOWN_VALUES.setdefault(enum.__name__, [])
+        if len(samples) < UNKNOWN_SAMPLES and val not in samples:
+            samples.append(val)
+        report_unknown(f"SafeEnum: '{val}' is not a valid {enum.__name__}. Assignd {type(val)} value. "
+                       'Further unknown values are only counted.',
+                       (enum.__name__, '<unknown value>'))
+        return val
+
+
+UNKNOWN: Counter[tuple[Any, ...]] = Counter()
+# A few example values per enum, for unknown_report().
+UNKNOWN_VALUES: dict[str, list[Any]] = {}
+UNKNOWN_SAMPLES = 5
+WARN_UNKNOWN = True
+
+
+def report_unknown(message: str, key: tuple[Any, ...]):
+    UNKNOWN[key] += 1
+    if WARN_UNKNOWN and UNKNOWN[key] == 1:
+        warnings.warn(message)
+
+
+def unknown_report() -> dict[str, dict[Any, Any]]:
+    report: dict[str, dict[Any, Any]] = {}
+    for (name, key), count in UNKNOWN.items():
+        report.setdefault(name, {})[key] = count
+    for name, samples in UNKNOWN_VALUES.items():
+        report.setdefault(name, {})['<samples>'] = list(samples)
+    return report
+
+
+_DECODERS: dict[type, Callable[[dict[str, Any]], Any]] = {}
+_COMPACT: dict[type, type] = {}
+
+
+def decoder(cls: Type[_API_RESPONCE]) -> Callable[[dict[str, Any]], _API_RESPONCE]:
+    try:
+        return _DECODERS[cls]
+    except KeyError:
+        pass
+    try:
+        decode = _compile_decoder(cls)
+    except (OSError, TypeError, SyntaxError):
+        decode = partial(_decode_kwargs, getattr(cls, '__compact_of__', cls))
+    _DECODERS[cls] = decode
+    return decode
+
+
+def decode(cls: Type[_API_RESPONCE], data: dict[str, Any], compact: bool = False) -> _API_RESPONCE:
+    if compact:
+        cls = compact_class(cls)
+    return decoder(cls)(data)
+
+
+def _decode_kwargs(cls: Type[_API_RESPONCE], data: dict[str, Any]) -> _API_RESPONCE:
+    return cls(**data)
+
+
+def _inline_init(cls: type):
+    # Flatten the whole __init__ chain of `cls` into plain statements over the raw dict,
+    # so a decoder can skip the kwargs packing and super() calls of every level.
+    defaults: dict[str, Any] = {}
+    reads: list[str] = []
+    body: list[str] = []
+    known: list[str] = []
+    attrs: list[str] = []
+
+    def inline(klass: type, bound: dict[str, str]):
+        init = next(vars(c)['__init__'] for c in klass.__mro__ if '__init__' in vars(c))
+        if init is vars(APIResponce)['__init__']:
+            body.append('if not __known.issuperset(__data):')
+            body.append('    __APIResponce.__init__(self, **{k: v for k, v in __data.items() '
+                        'if k not in __known})')
+            return
+        fn = ast.parse(textwrap.dedent(inspect.getsource(init))).body[0]
+        assert isinstance(fn, ast.FunctionDef)
+        args = fn.args.args[1:]
+        arg_defaults = dict(zip([a.arg for a in args[len(args) - len(fn.args.defaults):]],
+                                init.__defaults__ or ()))
+        for a in args:
+            if a.arg in bound:
+                if not bound[a.arg] == a.arg:
+                    body.append(f'{a.arg} = {bound[a.arg]}')
+                continue
+            if a.arg in known:
+                continue
+            known.append(a.arg)
+            if a.arg in arg_defaults:
+                defaults[f'__default_{a.arg}'] = arg_defaults[a.arg]
+                reads.append(f'{a.arg} = __data.get({a.arg!r}, __default_{a.arg})')
+            else:
+                reads.insert(0, f'{a.arg} = __data[{a.arg!r}]')
+        for stmt in fn.body:
+            call = stmt.value if isinstance(stmt, ast.Expr) else None
+            if isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) \
+                    and call.func.attr == '__init__' and isinstance(call.func.value, ast.Call) \
+                    and isinstance(call.func.value.func, ast.Name) and call.func.value.func.id == 'super':
+                parent = next(c for c in klass.__mro__[1:] if '__init__' in vars(c))
+                params = list(inspect.signature(vars(parent)['__init__']).parameters)[1:]
+                inline(parent, {**{params[i]: ast.unparse(a) for i, a in enumerate(call.args)},
+                                **{k.arg: ast.unparse(k.value) for k in call.keywords if k.arg}})
+                continue
+            if isinstance(stmt, ast.Assign):
+                for target in stmt.targets:
+                    if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) \
+                            and target.value.id == 'self' and target.attr not in attrs:
+                        attrs.append(target.attr)
+            body.extend(ast.unparse(stmt).splitlines())
+
+    inline(cls, {})
+    return reads, body, known, attrs, defaults
+
+
+def _compile_decoder(cls: type) -> Callable[[dict[str, Any]], Any]:
+    origin = getattr(cls, '__compact_of__', cls)
+    reads, body, known, _, defaults = _inline_init(origin)
+    namespace: dict[str, Any] = {
+        **defaults,
+        '__cls': cls, '__origin': origin, '__new': object.__new__,
+        '__APIResponce': CompactResponce if issubclass(cls, CompactResponce) else APIResponce,
+        '__known': frozenset(known),
+    }
+    # Inlined statements run with the globals of the module they were written in,
+    # so a chain spanning several modules keeps the plain cls(**data) path.
+    modules = {k.__module__ for k in origin.__mro__
+               if '__init__' in vars(k) and issubclass(k, APIResponce) and k is not APIResponce}
+    if not len(modules) == 1:
+        raise TypeError('Cannot inline __init__ across modules.', cls, modules)
+    scope = vars(sys.modules[modules.pop()])
+    if issubclass(cls, CompactResponce):
+        scope = {**scope, **{k: compact_class(v) for k, v in scope.items()
+                             if isinstance(v, type) and issubclass(v, APIResponce) and v is not APIResponce}}
+    required = [r for r in reads if '.get(' not in r]
+    optional = [r for r in reads if '.get(' in r]
+    source = '\n'.join(
+        ['def __decode(__data):',
+         '    self = __new(__cls)']
+        + (['    self._extra = None'] if issubclass(cls, CompactResponce) else [])
+        + ['    try:']
+        + ['        ' + r for r in required or ['pass']]
+        + ['    except KeyError:',
+           '        return __origin(**__data)']
+        + ['    ' + line for line in optional + body]
+        + ['    return self'])
+    exec(compile(source, f'<decoder {cls.__name__}>', 'exec'), {**scope, **namespace}, namespace)
+    return namespace['__decode']
+
+
+def compact_class(cls: Type[_API_RESPONCE]) -> Type[_API_RESPONCE]:
+    if issubclass(cls, CompactResponce) or cls is APIResponce:
+        return cls
+    try:
+        return _COMPACT[cls]  # type: ignore
+    except KeyError:
+        pass
+    attrs = [a if not isinstance(getattr(cls, a, None), lazy) else '_' + a
+             for a in _inline_init(cls)[3]]
+    namespace: dict[str, Any] = {}
+    for klass in reversed(cls.__mro__[:cls.__mro__.index(APIResponce)]):
+        namespace.update({k: v for k, v in vars(klass).items()
+                          if k not in ('__init__', '__dict__', '__weakref__', '__doc__',
+                                       '__abstractmethods__', '_abc_impl', '__lazy__')})
+    compact_cls = type(cls.__name__, (CompactResponce,), {
+        **namespace,
+        '__slots__': tuple(attrs),
+        '__fields__': tuple(attrs),
+        '__compact_of__': cls,
+        '__lazy__': getattr(cls, '__lazy__', {}),
+    })
+    _COMPACT[cls] = compact_cls
+    for k, v in namespace.items():
+        if isinstance(v, dict) and v and all(isinstance(c, type) and issubclass(c, APIResponce)
+                                             for c in v.values()):
+            setattr(compact_cls, k, {name: compact_class(c) for name, c in v.items()})
+    cls.register(compact_cls)  # type: ignore
+    return compact_cls  # type: ignore
 
 
 class Cookie(TypedDict):
@@ -112,21 +291,143 @@ class Cookie(TypedDict):
     value: str
 
 
+def encode_default(o: Any) -> Any:
+    if isinstance(o, APIResponce):
+        d = o._asdict()
+        if UNDEFINED in d.values():
+            return {k: v for k, v in d.items() if not v == UNDEFINED}
+        return d
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
 class FanboxJSONEncoder(json.encoder.JSONEncoder):
     def default(self, o: Any) -> Any:
         if isinstance(o, APIResponce):
-            return {k: v for k, v in o.__dict__.items()
-                    if k not in [] and not v == UNDEFINED}
+            return encode_default(o)
         else:
             return super().default(o)
 
 
-class APIResponce():
+class _Undecoded():
+    __slots__ = ('data',)
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+
+class lazy(Generic[_LAZY_VALUE]):
+    def __init__(self, decode: Callable[[Any, Any], _LAZY_VALUE]) -> None:
+        self.decode = decode
+        self.attr = ''
+
+    def __set_name__(self, owner: type, name: str):
+        self.attr = '_' + name
+        owner.__lazy__ = {**getattr(owner, '__lazy__', {}), self.attr: name}  # type: ignore
+
+    @overload
+    def __get__(self, obj: None, objtype: Any = None) -> 'lazy[_LAZY_VALUE]': ...
+    @overload
+    def __get__(self, obj: Any, objtype: Any = None) -> _LAZY_VALUE: ...
+
+    def __get__(self, obj: Any, objtype: Any = None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.attr)
+        if isinstance(value, _Undecoded):
+            value = self.decode(type(obj), value.data)
+            setattr(obj, self.attr, value)
+        return value
+
+    def __set__(self, obj: Any, value: Any):
+        # Raw API data is a list or dict of JSON objects; anything else is already decoded.
+        if isinstance(value, (list, dict)) \
+                and all(isinstance(v, dict) for v in (value.values() if isinstance(value, dict) else value)):
+            value = _Undecoded(value)
+        setattr(obj, self.attr, value)
+
+
+class APIResponce(metaclass=ABCMeta):
     def __init__(self, **kwargs) -> None:
-        for k, v in kwargs.items():
-            warnings.warn(f'Unknown Key "{k}" in <{type(self).__name__}>. (Module bug or Updated Fanbox API.) '
-                          'You can use this key but there is no autocomplete.')
-            setattr(self, k, v)
+        if not kwargs:
+            return
+        name = type(self).__name__
+        for k in kwargs:
+            report_unknown(f'Unknown Key "{k}" in <{name}>. (Module bug or Updated Fanbox API.) '
+                           'You can use this key but there is no autocomplete.', (name, k))
+        self.__dict__.update(kwargs)
+
+    __lazy__: dict[str, str] = {}
+
+    @classmethod
+    def _model(cls, model: Type[_API_RESPONCE]) -> Type[_API_RESPONCE]:
+        return model
+
+    def _asdict(self) -> dict[str, Any]:
+        if not self.__lazy__:
+            return self.__dict__
+        lazy = self.__lazy__
+        # Lazy fields are read through their descriptor, so nested objects keep model key order.
+        return {lazy.get(k, k): getattr(self, lazy[k]) if k in lazy else v
+                for k, v in self.__dict__.items()}
+
+
+_EXTRA_KEYS: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+class CompactResponce():
+    __slots__ = ('_extra',)
+    __fields__: tuple[str, ...] = ()
+
+    def __init__(self, **kwargs) -> None:
+        if not kwargs:
+            return
+        name = type(self).__name__
+        for k in kwargs:
+            report_unknown(f'Unknown Key "{k}" in <{name}>. (Module bug or Updated Fanbox API.) '
+                           'You can use this key but there is no autocomplete.', (name, k))
+        # Unknown keys are usually the same for every instance of a class,
+        # so the key tuple is shared and only the values are stored per object.
+        keys = tuple(kwargs)
+        self._extra = (_EXTRA_KEYS.setdefault(keys, keys), tuple(kwargs.values()))
+
+    def __getattr__(self, name: str) -> Any:
+        if not name == '_extra':
+            try:
+                keys, values = self._extra
+                return values[keys.index(name)]
+            except (AttributeError, TypeError, ValueError):
+                pass
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    __lazy__: dict[str, str] = {}
+
+    @classmethod
+    def _model(cls, model: Type[_API_RESPONCE]) -> Type[_API_RESPONCE]:
+        return compact_class(model)
+
+    def _asdict(self) -> dict[str, Any]:
+        lazy = self.__lazy__
+        d = {lazy.get(k, k): getattr(self, lazy.get(k, k), UNDEFINED) for k in self.__fields__}
+        extra = getattr(self, '_extra', None)
+        if extra is not None:
+            d.update(zip(*extra))
+        return d
+
+    def __reduce__(self):
+        # Compact classes are built at runtime, so pickle by the model they were made from.
+        state = {k: getattr(self, k) for k in ('_extra', *self.__fields__) if hasattr(self, k)}
+        return _unpickle_compact, (type(self).__compact_of__, state)  # type: ignore
+
+
+# Compact models are slotted copies rather than subclasses, but are still API responses.
+APIResponce.register(CompactResponce)
+
+
+def _unpickle_compact(cls: type, state: dict[str, Any]):
+    obj: Any = object.__new__(compact_class(cls))
+    for k, v in state.items():
+        setattr(obj, k, v)
+    return obj
 
 
 # === API Body Element ===
@@ -366,7 +667,7 @@ class _UrlEmbedFanboxCreator(_UrlEmbed):
     def __init__(self, id: str, type: str,
                  profile: dict,
                  **kwargs) -> None:
-        self.profile = _Creator(**profile)
+        self.profile = decoder(_Creator)(profile)
         super().__init__(id, type, **kwargs)
 
 
@@ -374,7 +675,7 @@ class _UrlEmbedFanboxPost(_UrlEmbed):
     def __init__(self, id: str, type: str,
                  postInfo: dict,
                  **kwargs) -> None:
-        self.postInfo = _EmbedPostInfo(**postInfo)
+        self.postInfo = decoder(_EmbedPostInfo)(postInfo)
         super().__init__(id, type, **kwargs)
 
 
@@ -390,51 +691,56 @@ class _PostInfoBody(APIResponce):
                  **kwargs) -> None:
                 
         self.text = text
-        self.files = maplist(files, _File)
-        self.images = maplist(images, _Image)
+        self.files = files
+        self.images = images
 
-        self.blocks = self.map_article_blocks(blocks)
-        self.imageMap = mapdict(imageMap, _Image)
-        self.fileMap = mapdict(fileMap, _File)
+        self.blocks = blocks
+        self.imageMap = imageMap
+        self.fileMap = fileMap
         self.embedMap = embedMap
-        self.urlEmbedMap = self.map_url_embeds(urlEmbedMap)
+        self.urlEmbedMap = urlEmbedMap
         super().__init__(**kwargs)
+
+    # Sub-structures are kept raw and decoded on first access.
+    files = lazy(lambda cls, raw: maplist(raw, cls._model(_File)))
+    images = lazy(lambda cls, raw: maplist(raw, cls._model(_Image)))
+    blocks = lazy(lambda cls, raw: cls.map_article_blocks(raw))
+    imageMap = lazy(lambda cls, raw: mapdict(raw, cls._model(_Image)))
+    fileMap = lazy(lambda cls, raw: mapdict(raw, cls._model(_File)))
+    urlEmbedMap = lazy(lambda cls, raw: cls.map_url_embeds(raw))
     
+    ARTICLE_BLOCK_TYPES: dict[str, Type[APIResponce]] = {
+        'p': _ArticleParagraphBlock,
+        'header': _ArticleHeaderBlock,
+        'image': _ArticleImageBlock,
+        'file': _ArticleFileBlock,
+        'url_embed': _ArticleURLEmbedBlock,
+    }
+    URL_EMBED_TYPES: dict[str, Type[APIResponce]] = {
+        'default': _UrlEmbedDefault,
+        'html': _UrlEmbedHtml,
+        'html.card': _UrlEmbedHtmlCard,
+        'fanbox.creator': _UrlEmbedFanboxCreator,
+        'fanbox.post': _UrlEmbedFanboxPost,
+    }
+
     @classmethod
     def create_article_block(cls, __dict: dict[Any, Any]):
-        _type = __dict['type']
-        if _type == 'p':
-            return _ArticleParagraphBlock(**__dict)
-        elif _type == 'header':
-            return _ArticleHeaderBlock(**__dict)
-        elif _type == 'image':
-            return _ArticleImageBlock(**__dict)
-        elif _type == 'file':
-            return _ArticleFileBlock(**__dict)
-        elif _type == 'url_embed':
-            return _ArticleURLEmbedBlock(**__dict)
+        _cls = cls.ARTICLE_BLOCK_TYPES.get(__dict['type'])
+        return decoder(_cls)(__dict) if _cls is not None else None
     
     @classmethod
     def map_article_blocks(
             cls, blocks: list[dict[str, Any]] | Type[UNDEFINED]):
         if isinstance(blocks, type):
             return UNDEFINED
-        else:
-            return list(map(cls.create_article_block, blocks))
+        decoders = {k: decoder(v) for k, v in cls.ARTICLE_BLOCK_TYPES.items()}
+        return [decoders[b['type']](b) if b['type'] in decoders else None for b in blocks]
     
     @classmethod
     def create_url_embed(cls, __dict: dict[Any, Any]):
-        _type = __dict['type']
-        if _type == 'default':
-            return _UrlEmbedDefault(**__dict)
-        elif _type == 'html':
-            return _UrlEmbedHtml(**__dict)
-        elif _type == 'html.card':
-            return _UrlEmbedHtmlCard(**__dict)
-        elif _type == 'fanbox.creator':
-            return _UrlEmbedFanboxCreator(**__dict)
-        elif _type == 'fanbox.post':
-            return _UrlEmbedFanboxPost(**__dict)
+        _cls = cls.URL_EMBED_TYPES.get(__dict['type'])
+        return decoder(_cls)(__dict) if _cls is not None else None
     
     @classmethod
     def map_url_embeds(
@@ -473,8 +779,8 @@ class _CommentItem(APIResponce):
 
 
 class _CommentList(APIResponce):
-    def __init__(self, items: list, nextUrl: str | None, **kwargs) -> None:
-        self.items = items
+    def __init__(self, items: list[dict], nextUrl: str | None, **kwargs) -> None:
+        self.items = maplist(items, _CommentItem)
         self.nextUrl = URL(nextUrl) if nextUrl is not None else None
         super().__init__(**kwargs)
 
@@ -702,7 +1008,7 @@ class _Payment(APIResponce):
 
 class APIPostPaginate(APIResponce):
     def __init__(self, body: list[str], **kwargs) -> None:
-        self.body = list(map(lambda x: URL(x), body))
+        self.body = [URL(x) for x in body]
         super().__init__(**kwargs)
 
 
@@ -1,12 +1,26 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-from . import types
-from typing import TYPE_CHECKING
+from functools import partial
+from itertools import islice
+from . import render, types
+from typing import TYPE_CHECKING, Generator, Iterable, Iterator, TypeVar
 
 
 if TYPE_CHECKING:
     from pyfanbox.main import CC_FANBOX_API
 
 
+_PAGE = TypeVar('_PAGE', types.APIPostListCreator, types.APIPostListComments)
+
+
+class _CrawlState():
+    def __init__(self, creatorId: str) -> None:
+        self.creatorId = creatorId
+        self.urls: deque[types.URL] | None = None
+        self.inflight = 0
+
+
 class utility():
     def __init__(self, api: 'CC_FANBOX_API') -> None:
         self.__api = api
@@ -23,92 +37,150 @@ class utility():
         
         return current_supportings
     
-    def get_browsable_posts(self, user_id: str):
+    def get_browsable_posts(self, user_id: str, max_workers: int = 1):
         browsable_posts: list[types._PostItem] = []
         
         urls = self.__api.POST.paginateCreator(user_id).body
-        for url in urls:
-            postList = self.__api.POST.listCreator(**self.__api.parse_qs(url)).body.items
+        postLists: Iterable[list[types._PostItem]]
+        if max_workers > 1 and len(urls) > 1:
+            self.__api.ensure_pool_size(max_workers)
+            with ThreadPoolExecutor(min(max_workers, len(urls))) as executor:
+                postLists = list(executor.map(self._list_page, urls))
+        else:
+            postLists = map(self._list_page, urls)
+        for postList in postLists:
             for post in postList:
                 if not post.isRestricted:
                     browsable_posts.append(post)
         
         return browsable_posts
+    
+    def _list_page(self, url: types.URL):
+        return self.__api.POST.listCreator(**self.__api.parse_qs(url)).body.items
+    
+    def iter_posts(self, creatorId: str, limit: int = 10, prefetch: bool = True,
+                   include_restricted: bool = True) -> Generator[types._PostItem, None, None]:
+        pages = self._iter_pages(types.APIPostListCreator, prefetch,
+                                 '/post.listCreator', creatorId=creatorId, limit=limit)
+        for page in pages:
+            for post in page.body.items:
+                if include_restricted or not post.isRestricted:
+                    yield post
+    
+    def iter_comments(self, postId: int | str, limit: int = 10,
+                      prefetch: bool = True) -> Iterator[types._CommentItem]:
+        pages = self._iter_pages(types.APIPostListComments, prefetch,
+                                 '/post.listComments', postId=postId, limit=limit)
+        for page in pages:
+            yield from page.body.items
+    
+    def _iter_pages(self, cls: type[_PAGE], prefetch: bool, _url: str, **query) -> Iterator[_PAGE]:
+        executor = ThreadPoolExecutor(1)
+        fetch = partial(self.__api.request, cls)
+        try:
+            future: Future | None = executor.submit(fetch, _url, **query)
+            while future is not None:
+                page = future.result()
+                nextUrl = page.body.nextUrl
+                future = None
+                if prefetch and nextUrl is not None:
+                    future = executor.submit(fetch, nextUrl)
+                yield page
+                if future is None and nextUrl is not None:
+                    future = executor.submit(fetch, nextUrl)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def crawl_creators(self, creatorIds: Iterable[str], max_workers: int = 4,
+                       max_per_creator: int = 1, include_restricted: bool = False,
+                       errors: dict[str, BaseException] | None = None
+                       ) -> Iterator[types._PostItem]:
+        # A creator whose paginate or list call fails is dropped and recorded in `errors`;
+        # the others are crawled to the end. Without `errors`, failures are raised at the end.
+        failed: dict[str, BaseException] = {} if errors is None else errors
+        creators = [_CrawlState(c) for c in dict.fromkeys(creatorIds)]
+        self.__api.ensure_pool_size(max_workers)
+        futures: dict[Future, _CrawlState] = {}
+        turn = 0
+
+        def next_task():
+            nonlocal turn
+            for i in range(len(creators)):
+                state = creators[(turn + i) % len(creators)]
+                if state.inflight >= max_per_creator:
+                    continue
+                if state.urls is None and state.inflight == 0:
+                    turn = (turn + i + 1) % len(creators)
+                    return state, executor.submit(self.__api.POST.paginateCreator, state.creatorId)
+                if state.urls:
+                    turn = (turn + i + 1) % len(creators)
+                    return state, executor.submit(self._list_page, state.urls.popleft())
+            return None
+
+        with ThreadPoolExecutor(max_workers) as executor:
+            while True:
+                while len(futures) < max_workers:
+                    task = next_task()
+                    if task is None:
+                        break
+                    state, future = task
+                    state.inflight += 1
+                    futures[future] = state
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    state = futures.pop(future)
+                    state.inflight -= 1
+                    if state.creatorId in failed:
+                        continue
+                    error = future.exception()
+                    if error is not None:
+                        failed[state.creatorId] = error
+                        state.urls = deque()
+                        continue
+                    result = future.result()
+                    if isinstance(result, types.APIPostPaginate):
+                        state.urls = deque(result.body)
+                        continue
+                    for post in result:
+                        if include_restricted or not post.isRestricted:
+                            yield post
+        if errors is None and failed:
+            raise RuntimeError('Crawl failed for some creators.', failed)
+
+    def fetch_posts(self, postIds: Iterable[int | str], max_workers: int = 4,
+                    ordered: bool = True
+                    ) -> Iterator[tuple[str, types.APIPostInfo | None, BaseException | None]]:
+        ids = (str(postId) for postId in postIds)
+        # Ordered mode queues a few ids ahead so one slow post does not idle the pool.
+        window = max_workers * 2 if ordered else max_workers
+        self.__api.ensure_pool_size(max_workers)
+        executor = ThreadPoolExecutor(max_workers)
+        futures: dict[Future, str] = {}
+
+        def fill():
+            for postId in islice(ids, window - len(futures)):
+                futures[executor.submit(self.__api.POST.info, postId)] = postId
+
+        try:
+            fill()
+            while futures:
+                done: Iterable[Future]
+                if ordered:
+                    done = [next(iter(futures))]
+                else:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    postId = futures.pop(future)
+                    fill()
+                    yield postId, None if error is not None else future.result(), error
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     @staticmethod
     def format_blog(body: types._PostInfoBody, creatorId: str):
-        text = ''
         if isinstance(body.blocks, type):
             return body.text
-        for block in body.blocks:
-            if isinstance(block, types._ArticleParagraphBlock):
-                t = ''
-                insertion = {}
-                if not isinstance(block.styles, type):
-                    for style in reversed(block.styles):
-                        b, e = style.offset, style.offset + style.length
-                        insertion[b] = ' **'
-                        insertion[e] = '** '
-                if not isinstance(block.links, type):
-                    for link in reversed(block.links):
-                        b, e = link.offset, link.offset + link.length
-                        if b in insertion:
-                            if insertion[b] == ' **':
-                                insertion[b] = ' **['
-                            elif insertion[b] == '** ':
-                                insertion[b] = '** ['
-                            else:
-                                insertion[b] = '['
-                        else:
-                            insertion[b] = '['
-                        if e in insertion:
-                            if insertion[e] == ' **':
-                                insertion[e] = '](' + link.url + ') **'
-                            elif insertion[e] == '** ':
-                                insertion[e] = '](' + link.url + ')** '
-                            else:
-                                insertion[e] = '](' + link.url + ')'
-                        else:
-                            insertion[e] = '](' + link.url + ')'
-                insertion = dict(sorted(insertion.items()))
-
-                prev = 0
-                for k, v in insertion.items():
-                    t += block.text[prev:k]
-                    t += v
-                    prev = k
-                t += block.text[prev:]
-                text += (t + '\n\n')
-            elif isinstance(block, types._ArticleHeaderBlock):
-                text += ('\n\n### ' + block.text + '\n\n')
-            elif isinstance(block, types._ArticleImageBlock):
-                text += ('{image:' + block.imageId + '}\n\n')
-            elif isinstance(block, types._ArticleFileBlock):
-                text += ('{file:' + block.fileId + '}\n\n')
-            elif isinstance(block, types._ArticleURLEmbedBlock):
-                if isinstance(body.urlEmbedMap, type):
-                    raise AttributeError('body.urlEmbedMap is not defined!')
-                urlEmbed = body.urlEmbedMap[block.urlEmbedId]
-                if isinstance(urlEmbed, types._UrlEmbedDefault):
-                    url = urlEmbed.url
-                    text += (f'[{url}]({url})\n\n')
-                elif isinstance(urlEmbed, types._UrlEmbedHtml):
-                    html = urlEmbed.html
-                    text += (html)
-                elif isinstance(urlEmbed, types._UrlEmbedHtmlCard):
-                    html = urlEmbed.html
-                    text += (html)
-                elif isinstance(urlEmbed, types._UrlEmbedFanboxCreator):
-                    creator_id = urlEmbed.profile.creatorId
-                    url = 'https://' + creator_id + '.fanbox.cc/'
-                    text += (f'[FANBOX CREATOR]({url})\n\n')
-                elif isinstance(urlEmbed, types._UrlEmbedFanboxPost):
-                    post_id = urlEmbed.postInfo.id
-                    url = 'https://' + creatorId + '.fanbox.cc/posts/' + post_id
-                    text += (f'[FANBOX POST]({url})\n\n')
-                else:
-                    text += ('! - UNKNOWN FORMAT OF URL EMBED - !\n\n')
-            else:
-                text += ('! - UNKNOWN FORMAT OF BLOCK - !\n\n')
-        
-        return text
\ No newline at end of file
+        return render.markdown.render(body, creatorId)